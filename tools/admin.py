@@ -1,3 +1,11 @@
 from django.contrib import admin
 
+from tools.models import BiasModel
+
 # Register your models here.
+@admin.register(BiasModel)
+class BiasModelAdmin(admin.ModelAdmin):
+    list_display = ('name', 'project', 'owner', 'method', 'monthly', 'quantiles', 'updated')
+    list_filter = ('method', 'monthly', 'project')
+    search_fields = ('name', 'project', 'owner__username')
+    readonly_fields = ('created', 'updated')
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ToolsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tools'
+
+    def ready(self):
+        # warm models and caches in the background as soon as the worker starts; off by default
+        # because ready() also runs for every management command
+        if getattr(settings, 'FORECAST_WARM_UP_ON_START', False):
+            from tools.views.api_code import start_warm_up
+            start_warm_up()
+        # hot reload of models/output.pkl and the workbook, see api_code.reload_resources()
+        if getattr(settings, 'FORECAST_RELOAD_SIGNAL', None):
+            from tools.views.api_code import install_reload_signal
+            install_reload_signal(settings.FORECAST_RELOAD_SIGNAL)
+        if getattr(settings, 'FORECAST_RELOAD_INTERVAL', None):
+            from tools.views.api_code import start_reload_watcher
+            start_reload_watcher(settings.FORECAST_RELOAD_INTERVAL)
@@ -0,0 +1,167 @@
+# Offline benchmark suite for the forecast, bias correction and plotting code.
+# Everything runs on generated data and a small LightGBM ensemble fitted on
+# it, so neither models/output.pkl nor the training workbook is needed. Run
+# it with `python manage.py benchmark`.
+import platform
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+# the columns of models/output.pkl's 'features'
+FEATURES = ['years_since_min', 'day', 'weekend', 'lag_Lake_Level']
+FEATURES += [f'dayofweek_{i}' for i in range(7)] + [f'month_{i}' for i in range(1, 13)]
+FEATURES += [f'quarter_{i}' for i in range(1, 5)] + [f'week_{i}' for i in range(1, 54)]
+
+
+def synthetic_training_data(years=6):
+    """A training snapshot of `years` daily seasonal levels."""
+    from tools.views import api_code
+
+    dates = pd.date_range('2010-01-01', periods=365 * years, freq='D')
+    t = np.arange(len(dates))
+    frame = pd.DataFrame({
+        'Date': dates,
+        'Lake_Level': 11 + 0.5 * np.sin(2 * np.pi * t / 365.25),
+    })
+    return api_code.TrainingSnapshot(frame)
+
+
+def synthetic_model_output(training_data, horizon=120):
+    """
+    A two-member LightGBM model_output fitted on the snapshot's calendar
+    features and `horizon`-day lag, predicting log levels like the trained
+    ensemble does.
+    """
+    import lightgbm
+    from tools.views import api_code
+
+    store = api_code.get_feature_store(tuple(FEATURES), training_data.min_date, training_data.max_date)
+    X = store.rows(training_data.min_date, training_data.max_date)
+    X[:, FEATURES.index('lag_Lake_Level')] = pd.Series(training_data.levels).shift(horizon).bfill().to_numpy()
+    X = pd.DataFrame(X, columns=FEATURES)
+    y = np.log(training_data.levels)
+    models = [
+        lightgbm.LGBMRegressor(n_estimators=100, num_leaves=15, colsample_bytree=0.8, random_state=seed, verbose=-1).fit(X, y)
+        for seed in (0, 1)
+    ]
+    return {'models': models, 'weights': np.array([0.4, 0.6]), 'features': list(FEATURES)}
+
+
+def synthetic_upload(rows, seed=0):
+    """Observed and remote-sensing frames shaped like the /bias/ uploads."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('1900-01-01', periods=rows, freq='D', name='Date')
+    season = 5 * np.sin(2 * np.pi * np.arange(rows) / 365.25)
+    observed = pd.DataFrame({'value': 20 + season + rng.normal(0, 1, rows)}, index=index)
+    remote = pd.DataFrame({'value': 1.2 * (18 + season) + rng.normal(0, 2, rows)}, index=index)
+    return observed, remote
+
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {"min_s": min(timings), "median_s": statistics.median(timings), "runs": repeat}
+
+
+def forecast_cases(sizes):
+    from tools.views import api_code
+
+    training_data = synthetic_training_data()
+    # forecasts of this snapshot run on these resources, not the loaded ones
+    training_data.resources = api_code.ForecastResources(synthetic_model_output(training_data), 'benchmark', training_data)
+    max_date = training_data.max_date
+    for days in sizes:
+        branches = {
+            'history': (max_date - pd.Timedelta(days=min(days, len(training_data) - 1)), max_date),
+            'straddling': (max_date - pd.Timedelta(days=days // 2), max_date + pd.Timedelta(days=days - days // 2)),
+            'future': (max_date + pd.Timedelta(days=1), max_date + pd.Timedelta(days=days)),
+        }
+        for branch, (start_date, end_date) in branches.items():
+            start = {"year": start_date.year, "month": start_date.month, "day": start_date.day}
+            end = {"year": end_date.year, "month": end_date.month, "day": end_date.day}
+
+            def run(start=start, end=end):
+                # an empty cache every run, so the ensemble is really evaluated
+                api_code.trajectory_cache.clear()
+                api_code.forecast(start, end, training_data)
+
+            yield f"forecast.{branch}", days, run
+
+
+def bias_cases(sizes):
+    from tools.skill_metrics import bootstrap_intervals
+    from tools.views import bias_view
+
+    methods = ['linear_scaling', 'quantile_mapping', 'delta_change', 'empirical_quantile', 'variance_scaling']
+    for rows in sizes:
+        observed, remote = synthetic_upload(rows)
+        for method in methods:
+            correct = getattr(bias_view, method)
+            yield f"bias.{method}", rows, lambda correct=correct, o=observed, r=remote: correct(o, r)
+        corrected = bias_view.quantile_mapping(observed, remote)
+        yield "bias.calculate_metrics", rows, lambda o=observed, c=corrected: bias_view.calculate_metrics(o, c)
+        obs, mod = observed['value'].to_numpy(), corrected['value'].to_numpy()
+        yield "bias.bootstrap_intervals", rows, lambda o=obs, m=mod: bootstrap_intervals(o, m, samples=200, seed=0)
+
+
+def plot_cases(sizes):
+    import matplotlib
+    matplotlib.use('Agg')
+    from tools.views import bias_view, levels_view
+
+    for rows in sizes:
+        observed, remote = synthetic_upload(rows)
+        corrected = bias_view.quantile_mapping(observed, remote)
+        yield "plot.bias", rows, lambda o=observed, c=corrected, r=remote: bias_view.generate_plot(o, c, r)
+        levels = observed.rename(columns={'value': 'water_levels'})
+        yield "plot.levels", rows, lambda l=levels: levels_view.generate_plot(l.copy(), 'water_levels')
+
+
+SUITES = {
+    'forecast': (forecast_cases, [365, 3650, 10950]),
+    'bias': (bias_cases, [1000, 10000, 100000]),
+    'plot': (plot_cases, [1000, 10000]),
+}
+
+
+def run_suite(suites=None, repeat=5, log=None):
+    """
+    Time every case of the selected suites and return a JSON-serialisable
+    report, `{"meta": ..., "results": {"<case>[<size>]": timings}}`.
+    """
+    results = {}
+    for name in suites or SUITES:
+        cases, sizes = SUITES[name]
+        for case, size, func in cases(sizes):
+            func()  # warm-up run, imports and lazy caches
+            key = f"{case}[{size}]"
+            results[key] = dict(time_call(func, repeat), case=case, size=size)
+            if log:
+                log(f"{key:<45} median {results[key]['median_s'] * 1e3:10.3f} ms")
+    meta = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "repeat": repeat,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(report, baseline, threshold=1.2):
+    """
+    Median-time ratios of `report` against `baseline` for the cases both
+    contain, and the keys slower than `threshold` times the baseline.
+    """
+    ratios = {}
+    for key, timings in report['results'].items():
+        before = baseline['results'].get(key)
+        if before and before['median_s'] > 0:
+            ratios[key] = timings['median_s'] / before['median_s']
+    regressions = [key for key, ratio in ratios.items() if ratio > threshold]
+    return ratios, regressions
@@ -0,0 +1,68 @@
+# Array helpers shared by the bias corrections of the bias() view and the
+# fitted bias models (tools.bias_models): which columns of an observed and a
+# remote sensing frame belong together, and np.interp / np.percentile for
+# every column of a 2-D array at once.
+import numpy as np
+
+
+def matching_columns(observed, modeled):
+    """
+    Numeric columns to correct, as (observed columns, modeled columns): the
+    ones both frames share by name or, when they share none, all of them by
+    position (e.g. one series with different headers in each file).
+    """
+    observed_columns = list(observed.select_dtypes('number').columns)
+    modeled_columns = list(modeled.select_dtypes('number').columns)
+    shared = [column for column in observed_columns if column in modeled_columns]
+    if shared:
+        return shared, shared
+    if observed_columns and len(observed_columns) == len(modeled_columns):
+        return observed_columns, modeled_columns
+    raise ValueError(f"No matching columns between observed {observed_columns} and remote sensing {modeled_columns} data.")
+
+
+def interp_columns(x, xp, fp):
+    """
+    np.interp(x[:, j], xp[:, j], fp[:, j]) for every column j in one pass. xp
+    must be sorted along axis 0. The position of each x among xp is found by
+    a stable argsort of the stacked columns (xp first, so that ties count as
+    xp <= x like np.interp), then the same slope formula is applied.
+    """
+    n_xp, n_columns = xp.shape
+    stacked = np.concatenate([xp, x])
+    order = np.argsort(stacked, axis=0, kind='stable')
+    seen = np.cumsum(order < n_xp, axis=0)
+    is_x = order >= n_xp
+    columns = np.broadcast_to(np.arange(n_columns), order.shape)
+    right = np.empty(x.shape, dtype=np.intp)
+    right[order[is_x] - n_xp, columns[is_x]] = seen[is_x]
+    # xp[j] <= x < xp[j + 1]
+    j = np.clip(right - 1, 0, n_xp - 2) if n_xp > 1 else np.zeros_like(right)
+    take = lambda a, i: np.take_along_axis(a, i, axis=0)
+    x0, y0 = take(xp, j), take(fp, j)
+    if n_xp > 1:
+        x1, y1 = take(xp, j + 1), take(fp, j + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corrected = (y1 - y0) / (x1 - x0) * (x - x0) + y0
+    else:
+        corrected = y0.copy()
+    corrected = np.where(right == 0, fp[:1], corrected)
+    corrected = np.where(right >= n_xp, fp[-1:], corrected)
+    corrected[np.isnan(x)] = np.nan
+    return corrected
+
+
+def sorted_percentiles(sorted_values, count):
+    # np.percentile(values, np.linspace(0, 100, count), axis=0) from values already sorted along axis 0,
+    # without np.percentile's partition for each of the `count` quantiles
+    n = len(sorted_values)
+    virtual = (n - 1) * (np.linspace(0, 100, count) / 100)
+    previous = np.floor(virtual)
+    gamma = (virtual - previous)[:, np.newaxis]
+    previous = previous.astype(np.intp)
+    above = virtual >= n - 1
+    previous[above] = n - 1
+    following = np.where(above, n - 1, previous + 1)
+    a, b = sorted_values[previous], sorted_values[following]
+    diff = b - a
+    return np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
@@ -0,0 +1,146 @@
+# Bias corrections split into a fit step and an apply step. fit_bias_model()
+# calibrates a method once against a reference period (observed and remote
+# sensing frames) and keeps only its parameters: scale factors and means per
+# column, or fixed-size quantile tables, optionally one set per calendar
+# month. apply_bias_model() corrects new remote sensing data from those
+# parameters alone, in O(n log q) for quantile tables of q levels. Fitted
+# parameters are plain JSON (see tools.models.BiasModel).
+import warnings
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from tools.bias_corrections import interp_columns, matching_columns
+
+FITTABLE_METHODS = ('linear_scaling', 'variance_scaling', 'delta_change', 'quantile_mapping')
+# methods that can keep one set of parameters per calendar month
+MONTHLY_METHODS = ('linear_scaling', 'variance_scaling', 'quantile_mapping')
+
+
+def default_quantiles():
+    return getattr(settings, 'BIAS_MODEL_QUANTILES', 101)
+
+
+def _groups(index, monthly):
+    # 0..11 for the month of each row, or a single group 0
+    if monthly:
+        return np.asarray(index.month) - 1
+    return np.zeros(len(index), dtype=np.intp)
+
+
+def _per_group(values, groups, n_groups, reduce):
+    """
+    reduce(rows) for the rows of every group, as (groups, ...). Groups
+    without valid rows take the value over all rows instead.
+    """
+    with warnings.catch_warnings():
+        # columns or months without data give NaN, filled below
+        warnings.simplefilter('ignore', RuntimeWarning)
+        overall = reduce(values)
+        if n_groups == 1:
+            return overall[None]
+        result = np.stack([reduce(values[groups == g]) if (groups == g).any() else np.full_like(overall, np.nan) for g in range(n_groups)])
+    return np.where(np.isnan(result), overall, result)
+
+
+def _to_json(array):
+    # JSON has no NaN, missing values are stored as null
+    array = np.asarray(array, dtype=float)
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+def _from_json(values):
+    return np.array(values, dtype=float)
+
+
+def fit_bias_model(method, observed, modeled, monthly=False, quantiles=None):
+    """
+    Parameters of `method` fitted on the matching columns of the observed and
+    remote sensing frames (date-indexed, as read by tools.uploads), as
+    {"method", "monthly", "quantiles", "columns", "parameters"}. Raises
+    ValueError for methods that can't be fitted or fitted per month.
+    """
+    if method not in FITTABLE_METHODS:
+        raise ValueError(f"Method '{method}' can't be fitted, use one of {', '.join(FITTABLE_METHODS)}.")
+    if monthly and method not in MONTHLY_METHODS:
+        raise ValueError(f"Method '{method}' has no monthly form.")
+    observed_columns, modeled_columns = matching_columns(observed, modeled)
+    obs = observed[observed_columns].to_numpy(dtype=float)
+    mod = modeled[modeled_columns].to_numpy(dtype=float)
+    n_groups = 12 if monthly else 1
+    obs_groups = _groups(observed.index, monthly)
+    mod_groups = _groups(modeled.index, monthly)
+
+    if method == 'linear_scaling':
+        observed_mean = _per_group(obs, obs_groups, n_groups, lambda v: np.nanmean(v, axis=0))
+        modeled_mean = _per_group(mod, mod_groups, n_groups, lambda v: np.nanmean(v, axis=0))
+        parameters = {"scale": _to_json(observed_mean / modeled_mean)}
+    elif method == 'variance_scaling':
+        parameters = {
+            "observed_mean": _to_json(_per_group(obs, obs_groups, n_groups, lambda v: np.nanmean(v, axis=0))),
+            "observed_std": _to_json(_per_group(obs, obs_groups, n_groups, lambda v: np.nanstd(v, axis=0))),
+            "modeled_mean": _to_json(_per_group(mod, mod_groups, n_groups, lambda v: np.nanmean(v, axis=0))),
+            "modeled_std": _to_json(_per_group(mod, mod_groups, n_groups, lambda v: np.nanstd(v, axis=0))),
+        }
+    elif method == 'delta_change':
+        # as delta_change(): the change of the observed series over the reference period
+        parameters = {"change": _to_json((obs[-1] - obs[0])[None])}
+    else:
+        quantiles = quantiles or default_quantiles()
+        if quantiles < 2:
+            raise ValueError("Quantile tables need at least 2 levels.")
+        levels = np.linspace(0, 1, quantiles)
+        quantile = lambda v: np.nanquantile(v, levels, axis=0) if len(v) else np.full((quantiles, v.shape[1]), np.nan)
+        parameters = {
+            "modeled_quantiles": _to_json(_per_group(mod, mod_groups, n_groups, quantile)),
+            "observed_quantiles": _to_json(_per_group(obs, obs_groups, n_groups, quantile)),
+        }
+
+    return {
+        "method": method,
+        "monthly": bool(monthly),
+        "quantiles": quantiles if method == 'quantile_mapping' else None,
+        "columns": [str(c) for c in observed_columns],
+        "parameters": parameters,
+    }
+
+
+def _model_columns(fitted, modeled):
+    # the fitted columns by name, or all numeric columns by position
+    columns = fitted['columns']
+    if all(c in modeled.columns for c in columns):
+        return columns
+    numeric = list(modeled.select_dtypes('number').columns)
+    if len(numeric) == len(columns):
+        return numeric
+    raise ValueError(f"Data columns {numeric} don't match the model's columns {columns}.")
+
+
+def apply_bias_model(fitted, modeled):
+    """
+    `modeled` (date-indexed remote sensing data) corrected with the
+    parameters of fit_bias_model(), as a frame with the fitted column names.
+    """
+    values = modeled[_model_columns(fitted, modeled)].to_numpy(dtype=float)
+    groups = _groups(modeled.index, fitted['monthly'])
+    parameters = {name: _from_json(value) for name, value in fitted['parameters'].items()}
+    method = fitted['method']
+
+    if method == 'linear_scaling':
+        corrected = values * parameters['scale'][groups]
+    elif method == 'variance_scaling':
+        std_factor = parameters['observed_std'] / parameters['modeled_std']
+        corrected = (values - parameters['modeled_mean'][groups]) * std_factor[groups] + parameters['observed_mean'][groups]
+    elif method == 'delta_change':
+        corrected = values + parameters['change'][0]
+    elif method == 'quantile_mapping':
+        # every value placed in its month's table of q levels, all columns at once
+        modeled_quantiles, observed_quantiles = parameters['modeled_quantiles'], parameters['observed_quantiles']
+        corrected = np.empty_like(values)
+        for g in np.unique(groups):
+            rows = groups == g
+            corrected[rows] = interp_columns(values[rows], modeled_quantiles[g], observed_quantiles[g])
+    else:
+        raise ValueError(f"Unknown bias model method '{method}'.")
+    return pd.DataFrame(corrected, index=modeled.index, columns=fitted['columns'])
@@ -0,0 +1,161 @@
+# Per-stage latency instrumentation. Code marks its stages with
+#
+#     with stage('forecast.inference'):
+#         ...
+#
+# and every stage gets a latency histogram, exposed in the Prometheus text
+# format by MetricsView (/metrics/). Turned on by INSTRUMENTATION_ENABLED in
+# settings; when it is off stage() hands back a shared no-op context manager.
+# With InstrumentationMiddleware installed and INSTRUMENTATION_SERVER_TIMING
+# set, the stages of a request are also sent back in a Server-Timing header.
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+# upper bounds in seconds, the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+# (name, seconds) of the stages run for the current request, None outside of one
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_NOOP = contextlib.nullcontext()
+
+
+_enabled = None
+
+
+def enabled():
+    # read once, stage() sits on hot paths and a missing setting costs an exception per lookup
+    global _enabled
+    if _enabled is None:
+        _enabled = bool(getattr(settings, 'INSTRUMENTATION_ENABLED', False))
+    return _enabled
+
+
+def _reset_enabled(setting, **kwargs):
+    global _enabled
+    if setting == 'INSTRUMENTATION_ENABLED':
+        _enabled = None
+
+
+setting_changed.connect(_reset_enabled)
+
+
+def observe(name, seconds):
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class _Stage:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def stage(name):
+    """Context manager timing the block as stage `name`, a no-op when instrumentation is off."""
+    if not enabled():
+        return _NOOP
+    return _Stage(name)
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def render_metrics():
+    """All stage histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP livwa_stage_seconds Latency of instrumented stages.",
+        "# TYPE livwa_stage_seconds histogram",
+    ]
+    with _histograms_lock:
+        snapshot = {name: (list(h.counts), h.sum, h.count, h.buckets) for name, h in _histograms.items()}
+    for name in sorted(snapshot):
+        counts, total, count, buckets = snapshot[name]
+        cumulative = 0
+        for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+            cumulative += bucket_count
+            lines.append(f'livwa_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'livwa_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+        lines.append(f'livwa_stage_seconds_count{{stage="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings):
+    # stages run more than once in a request (e.g. one per forecast block) are summed
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1e3:.2f}" for name, seconds in totals.items())
+
+
+class InstrumentationMiddleware:
+    """
+    Times every request (stage `request.<url name>`) and the rendering of its
+    response (`render`, which is where DRF encodes JSON and templates are
+    filled in), and adds the Server-Timing header when
+    INSTRUMENTATION_SERVER_TIMING is set.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        timings = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        timings.append((f"request.{match.url_name if match else 'unresolved'}", time.perf_counter() - started))
+        observe(*timings[-1])
+        if getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', False):
+            response['Server-Timing'] = server_timing(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        # called right before render(), which runs the post-render callbacks last
+        if enabled():
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda r: observe('render', time.perf_counter() - started))
+        return response
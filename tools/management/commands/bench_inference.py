@@ -0,0 +1,56 @@
+import timeit
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from tools.views import api_code
+
+
+class Command(BaseCommand):
+    help = "Time per-call ensemble inference latency through DataFrames (before) and native float32 arrays (after)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1, 120], help="Block sizes to time.")
+        parser.add_argument('--number', type=int, default=50, help="Calls per timing run.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timing runs, the fastest is reported.")
+
+    def handle(self, *args, **options):
+        resources = api_code.get_resources()
+        training_data = resources.training_data
+        if training_data is None:
+            raise CommandError("Training data is not loaded.")
+        models = resources.model_output['models']
+        weights = resources.model_output['weights']
+        features = list(resources.model_output['features'])
+
+        store = api_code.get_feature_store(tuple(features), training_data.min_date, training_data.max_date)
+        first_day = training_data.max_date + pd.Timedelta(days=1)
+        X = store.rows(first_day, first_day + pd.Timedelta(days=max(options['rows']) - 1))
+        X[:, features.index('lag_Lake_Level')] = training_data.levels[-1]
+
+        self.stdout.write(f"{len(models)} models, {len(features)} features")
+        for rows in options['rows']:
+            block = np.ascontiguousarray(X[:rows])
+
+            def dataframe_path():
+                frame = pd.DataFrame(block, columns=features)
+                model_predictions = [np.exp(model.predict(frame[features].astype('float32'))) for model in models]
+                return np.sum(np.array(model_predictions) * weights[:, np.newaxis], axis=0)
+
+            def array_path():
+                return api_code._predict_ensemble(block, resources.predictors, weights)
+
+            expected, actual = dataframe_path(), array_path()
+            max_diff = np.max(np.abs(actual - expected))
+            if not np.allclose(actual, expected, rtol=1e-6):
+                self.stderr.write(f"{rows} rows: array path differs from the DataFrame path by up to {max_diff:.3g}")
+            before = self.time_call(dataframe_path, options)
+            after = self.time_call(array_path, options)
+            self.stdout.write(
+                f"{rows:>6} rows  dataframe {before * 1e3:9.3f} ms  array {after * 1e3:9.3f} ms  "
+                f"speedup {before / after:6.2f}x  max abs diff {max_diff:.3g}"
+            )
+
+    def time_call(self, func, options):
+        runs = timeit.Timer(func).repeat(repeat=options['repeat'], number=options['number'])
+        return min(runs) / options['number']
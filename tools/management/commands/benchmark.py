@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from tools import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time forecast(), the bias corrections, calculate_metrics, the bootstrap intervals and the plot helpers on synthetic data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=sorted(benchmarks.SUITES), action='append', help="Suite to run (repeatable, default all).")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case.")
+        parser.add_argument('--output', help="Write the report as JSON to this file.")
+        parser.add_argument('--compare', help="Baseline JSON report to compare against.")
+        parser.add_argument('--threshold', type=float, default=1.2, help="Slowdown ratio reported as a regression.")
+
+    def handle(self, *args, **options):
+        report = benchmarks.run_suite(options['suite'], options['repeat'], log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(report['results'])} results to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            ratios, regressions = benchmarks.compare(report, baseline, options['threshold'])
+            for key, ratio in sorted(ratios.items()):
+                style = self.style.ERROR if key in regressions else self.style.SUCCESS
+                self.stdout.write(style(f"{key:<45} {ratio:6.2f}x"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} case(s) slower than {options['threshold']}x the baseline")
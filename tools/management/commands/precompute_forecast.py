@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from tools.views import api_code
+
+
+class Command(BaseCommand):
+    help = "Run the forecast ensemble once over a future span and write it to the memory-mapped forecast store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=30, help="Number of years past the last training date to precompute.")
+        parser.add_argument('--horizon', type=int, default=120, help="Forecast horizon the store is computed for.")
+        parser.add_argument('--output', default=api_code.forecast_store_path, help="Path of the store; the levels go to a versioned .npy next to it, the metadata to its .json.")
+
+    def handle(self, *args, **options):
+        training_data = api_code.get_training_data()
+        if training_data is None:
+            raise CommandError("Training data is not loaded.")
+        days = options['years'] * 365
+        if days <= 0:
+            raise CommandError("--years must be positive.")
+        meta = api_code.write_forecast_store(options['output'], training_data, days, options['horizon'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {meta['days']} days from {meta['first_date']} to {meta['data_file']}"
+        ))
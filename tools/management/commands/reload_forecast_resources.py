@@ -0,0 +1,44 @@
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from tools.views import api_code
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the current models/output.pkl and workbook with a smoke forecast, then tell the "
+        "workers to hot-reload them: touch the reload trigger file (seen by workers running the "
+        "file-change check) and signal the given worker pids."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pid', type=int, action='append', default=[], help="Worker pid to signal (repeatable).")
+        parser.add_argument('--signal', default='SIGUSR2', help="Signal the workers reload on (FORECAST_RELOAD_SIGNAL).")
+        parser.add_argument('--skip-check', action='store_true', help="Don't load and smoke-test the files first.")
+
+    def handle(self, *args, **options):
+        if not options['skip_check']:
+            try:
+                resources = api_code.load_resources()
+                api_code._smoke_forecast(resources)
+            except Exception as e:
+                raise CommandError(f"New model or training data failed the smoke forecast: {e}")
+            self.stdout.write(f"Model {resources.model_fingerprint[:12]} and training data {resources.training_data.fingerprint[:12]} passed the smoke forecast.")
+
+        with open(api_code.reload_trigger_path, 'w') as f:
+            f.write(f"{time.time()}\n")
+        self.stdout.write(f"Touched {api_code.reload_trigger_path}")
+
+        signum = getattr(signal, options['signal'], None)
+        if options['pid'] and signum is None:
+            raise CommandError(f"Unknown signal {options['signal']}")
+        for pid in options['pid']:
+            try:
+                os.kill(pid, signum)
+            except OSError as e:
+                self.stderr.write(f"Could not signal {pid}: {e}")
+                continue
+            self.stdout.write(f"Sent {options['signal']} to {pid}")
+        self.stdout.write(self.style.SUCCESS("Reload requested."))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BiasModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('project', models.CharField(blank=True, default='', max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('method', models.CharField(choices=[('linear_scaling', 'Linear Scaling'), ('variance_scaling', 'Variance Scaling'), ('delta_change', 'Delta Change'), ('quantile_mapping', 'Quantile Mapping')], max_length=32)),
+                ('monthly', models.BooleanField(default=False)),
+                ('quantiles', models.PositiveIntegerField(blank=True, null=True)),
+                ('columns', models.JSONField(default=list)),
+                ('parameters', models.JSONField(default=dict)),
+                ('reference_start', models.DateField(blank=True, null=True)),
+                ('reference_end', models.DateField(blank=True, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bias_models', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['project', 'name'],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'project', 'name'), name='unique_bias_model_name')],
+            },
+        ),
+    ]
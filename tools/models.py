@@ -1,3 +1,51 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class BiasModel(models.Model):
+    """
+    A bias correction fitted once against a reference period (see
+    tools.bias_models) and applied to later remote sensing deliveries. Only
+    the parameters are kept, never the series it was fitted on.
+    """
+    METHOD_CHOICES = [
+        ('linear_scaling', 'Linear Scaling'),
+        ('variance_scaling', 'Variance Scaling'),
+        ('delta_change', 'Delta Change'),
+        ('quantile_mapping', 'Quantile Mapping'),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bias_models')
+    project = models.CharField(max_length=100, blank=True, default='')
+    name = models.CharField(max_length=100)
+    method = models.CharField(max_length=32, choices=METHOD_CHOICES)
+    monthly = models.BooleanField(default=False)
+    quantiles = models.PositiveIntegerField(null=True, blank=True)
+    columns = models.JSONField(default=list)
+    parameters = models.JSONField(default=dict)
+    reference_start = models.DateField(null=True, blank=True)
+    reference_end = models.DateField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['project', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'project', 'name'], name='unique_bias_model_name'),
+        ]
+
+    def __str__(self):
+        return f"{self.project}/{self.name}" if self.project else self.name
+
+    def fitted(self):
+        return {
+            "method": self.method,
+            "monthly": self.monthly,
+            "quantiles": self.quantiles,
+            "columns": self.columns,
+            "parameters": self.parameters,
+        }
+
+    def apply(self, modeled):
+        from tools.bias_models import apply_bias_model
+        return apply_bias_model(self.fitted(), modeled)
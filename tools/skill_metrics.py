@@ -0,0 +1,132 @@
+# Skill scores of modeled against observed series (RMSE, MAE, Bias,
+# Correlation, NSE, KGE), all derived from one set of sufficient statistics:
+# per series the count, sums, sums of squares, cross-products and absolute
+# errors of the aligned pairs. Inputs are arrays with time along the first
+# axis and any number of series along the others, e.g. (n, stations) or
+# (n, stations, methods), so many series are scored in one NumPy pass.
+# Because the statistics are plain sums over rows, a bootstrap resample is a
+# weighted sum, and bootstrap_intervals() scores a whole batch of resamples
+# with one matrix product.
+import warnings
+
+import numpy as np
+
+METRICS = ('RMSE', 'MAE', 'Bias', 'Correlation', 'NSE', 'KGE')
+
+
+def _prepare(observed, modeled):
+    # broadcast to (n, series), drop pairs with a missing value and shift both by
+    # the observed mean, so the sums of squares don't cancel for series far from 0
+    observed, modeled = np.broadcast_arrays(np.asarray(observed, dtype=float), np.asarray(modeled, dtype=float))
+    shape = observed.shape[1:]
+    observed = observed.reshape(len(observed), int(np.prod(shape)))
+    modeled = modeled.reshape(len(modeled), int(np.prod(shape)))
+    valid = ~(np.isnan(observed) | np.isnan(modeled))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(valid, observed, 0.0).sum(axis=0) / valid.sum(axis=0)
+    shift = np.nan_to_num(shift)
+    observed = np.where(valid, observed - shift, 0.0)
+    modeled = np.where(valid, modeled - shift, 0.0)
+    return shape, shift, valid, observed, modeled
+
+
+def _row_terms(valid, observed, modeled):
+    # (n, statistics, series) with the statistics count, obs, mod, obs_sq, mod_sq, cross
+    # and abs_error; observed and modeled are already 0 where invalid
+    return np.stack([
+        valid.astype(float),
+        observed,
+        modeled,
+        observed * observed,
+        modeled * modeled,
+        observed * modeled,
+        np.abs(modeled - observed),
+    ], axis=1)
+
+
+def _scores(sums, shift):
+    """Every score from statistics summed over rows, `sums[..., statistic, series]`."""
+    count, obs, mod, obs_sq, mod_sq, cross, abs_error = np.moveaxis(sums, -2, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        count = np.where(count > 0, count, np.nan)
+        obs_ss = obs_sq - obs * obs / count
+        mod_ss = mod_sq - mod * mod / count
+        covariance = cross - obs * mod / count
+        error_sq = obs_sq - 2 * cross + mod_sq
+        correlation = covariance / np.sqrt(obs_ss * mod_ss)
+        alpha = np.sqrt(mod_ss / obs_ss)
+        beta = (mod / count + shift) / (obs / count + shift)
+        return {
+            'RMSE': np.sqrt(np.maximum(error_sq, 0) / count),
+            'MAE': abs_error / count,
+            'Bias': (mod - obs) / count,
+            'Correlation': correlation,
+            'NSE': 1 - error_sq / obs_ss,
+            'KGE': 1 - np.sqrt((correlation - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2),
+        }
+
+
+def skill_scores(observed, modeled):
+    """
+    Every score in METRICS for aligned observed and modeled arrays (time
+    along axis 0, broadcast against each other), as {metric: array} with
+    one value per series, or floats for 1-D inputs. Pairs where either
+    value is missing are left out of that series' scores.
+    """
+    shape, shift, valid, observed, modeled = _prepare(observed, modeled)
+    # the column sums of _row_terms(), without building it
+    sums = np.stack([
+        valid.sum(axis=0, dtype=float),
+        observed.sum(axis=0),
+        modeled.sum(axis=0),
+        np.einsum('ij,ij->j', observed, observed),
+        np.einsum('ij,ij->j', modeled, modeled),
+        np.einsum('ij,ij->j', observed, modeled),
+        np.abs(modeled - observed).sum(axis=0),
+    ])
+    scores = _scores(sums, shift)
+    if not shape:
+        return {metric: float(value[0]) for metric, value in scores.items()}
+    return {metric: value.reshape(shape) for metric, value in scores.items()}
+
+
+def bootstrap_intervals(observed, modeled, samples=1000, confidence=0.95, seed=None, batch_size=None):
+    """
+    Percentile bootstrap confidence intervals of every score in METRICS, as
+    {metric: (low, high)} with arrays shaped like skill_scores() values.
+    Each resample draws the rows with replacement; its statistics are the
+    row terms weighted by how often each row was drawn, so a batch of
+    resamples is one (resamples x rows) @ (rows x terms) product. Batches
+    hold about 4M weights unless `batch_size` is given.
+    """
+    shape, shift, valid, observed, modeled = _prepare(observed, modeled)
+    n = len(valid)
+    if n == 0:
+        nan = float('nan') if not shape else np.full(shape, np.nan)
+        return {metric: (nan, nan) for metric in METRICS}
+    terms = _row_terms(valid, observed, modeled)
+    flat_terms = terms.reshape(n, -1)
+    rng = np.random.default_rng(seed)
+    batch_size = batch_size or max(1, 4_000_000 // max(n, 1))
+
+    resampled = {metric: [] for metric in METRICS}
+    for start in range(0, samples, batch_size):
+        batch = min(batch_size, samples - start)
+        draws = rng.integers(0, n, size=(batch, n))
+        weights = np.bincount((draws + n * np.arange(batch)[:, None]).ravel(), minlength=batch * n)
+        sums = (weights.reshape(batch, n).astype(float) @ flat_terms).reshape((batch,) + terms.shape[1:])
+        for metric, value in _scores(sums, shift).items():
+            resampled[metric].append(value)
+
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for metric, values in resampled.items():
+        with warnings.catch_warnings():
+            # series without a single valid pair stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanpercentile(np.concatenate(values), [tail, 100 - tail], axis=0)
+        if not shape:
+            intervals[metric] = (float(low[0]), float(high[0]))
+        else:
+            intervals[metric] = (low.reshape(shape), high.reshape(shape))
+    return intervals
@@ -0,0 +1,27 @@
+# Test doubles shared by the test modules.
+import numpy as np
+
+from tools.benchmarks import FEATURES, synthetic_training_data
+
+
+class LagModel:
+    """Stand-in booster: log of a damped lag plus a small weekly term."""
+    def __init__(self, features, damping):
+        self.lag_col = features.index('lag_Lake_Level')
+        self.week_cols = [i for i, f in enumerate(features) if f.startswith('week_')]
+        self.damping = damping
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float)
+        week = X[:, self.week_cols].argmax(axis=1)
+        return np.log(X[:, self.lag_col] * self.damping + 0.001 * week)
+
+
+def synthetic_forecast_inputs(years=6):
+    """A training snapshot of `years` daily levels and a two-member model_output of LagModels."""
+    model_output = {
+        'models': [LagModel(FEATURES, 0.998), LagModel(FEATURES, 0.999)],
+        'weights': np.array([0.4, 0.6]),
+        'features': list(FEATURES),
+    }
+    return synthetic_training_data(years), model_output
@@ -0,0 +1,117 @@
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from tools import bias_corrections
+from tools.benchmarks import synthetic_upload
+from tools.views import bias_view
+
+
+def wide_upload(rows, stations=4):
+    # one column per station, each with its own scale, offset and a few gaps
+    observed, remote = synthetic_upload(rows)
+    observed = pd.concat({f's{i}': observed['value'] * (1 + i / 10) for i in range(stations)}, axis=1)
+    remote = pd.concat({f's{i}': remote['value'] + i for i in range(stations)}, axis=1)
+    remote.iloc[3::97, 1] = np.nan
+    return observed, remote
+
+
+class MultiColumnCorrectionTests(SimpleTestCase):
+    def test_wide_files_match_one_column_at_a_time(self):
+        observed, remote = wide_upload(1000)
+        for method in bias_view.BIAS_METHODS:
+            with self.subTest(method=method):
+                correct = getattr(bias_view, method)
+                wide = correct(observed, remote)
+                self.assertEqual(list(wide.columns), list(observed.columns))
+                for column in observed:
+                    np.testing.assert_array_equal(wide[column].to_numpy(), correct(observed[[column]], remote[[column]])[column].to_numpy())
+
+    def test_interpolation_matches_np_interp(self):
+        rng = np.random.default_rng(0)
+        # ties between x and xp, values outside xp's range and missing values
+        xp = np.sort(rng.integers(0, 20, size=(50, 3)).astype(float), axis=0)
+        fp = np.sort(rng.normal(size=(50, 3)), axis=0)
+        x = rng.integers(-5, 25, size=(200, 3)).astype(float)
+        x[::17, 1] = np.nan
+        corrected = bias_corrections.interp_columns(x, xp, fp)
+        for j in range(3):
+            np.testing.assert_allclose(corrected[:, j], np.interp(x[:, j], xp[:, j], fp[:, j]), rtol=1e-12)
+
+    def test_single_column_methods_match_their_formulas(self):
+        observed, remote = synthetic_upload(500)
+        obs, mod = observed['value'].to_numpy(dtype=float), remote['value'].to_numpy(dtype=float)
+        expected = {
+            'linear_scaling': mod * obs.mean() / mod.mean(),
+            'quantile_mapping': np.interp(mod, np.sort(mod), np.sort(obs)),
+            'delta_change': mod + obs[-1] - obs[0],
+            'empirical_quantile': np.interp(mod, np.percentile(mod, np.linspace(0, 100, len(obs))), obs),
+            'variance_scaling': (mod - mod.mean()) * obs.std() / mod.std() + obs.mean(),
+        }
+        for method, values in expected.items():
+            with self.subTest(method=method):
+                np.testing.assert_allclose(getattr(bias_view, method)(observed, remote)['value'].to_numpy(), values, rtol=1e-10)
+
+    def test_columns_are_matched_by_name_then_by_position(self):
+        observed, remote = wide_upload(100, stations=2)
+        self.assertEqual(bias_corrections.matching_columns(observed, remote[['s1', 's0']]), (['s0', 's1'], ['s0', 's1']))
+        renamed = remote.rename(columns={'s0': 'a', 's1': 'b'})
+        self.assertEqual(bias_corrections.matching_columns(observed, renamed), (['s0', 's1'], ['a', 'b']))
+        with self.assertRaises(ValueError):
+            bias_corrections.matching_columns(observed, renamed[['a']])
+
+
+class CompareAllTests(SimpleTestCase):
+    def setUp(self):
+        self.observed, self.remote = wide_upload(800, stations=3)
+
+    def test_every_method_matches_its_own_correction(self):
+        corrected_by_method, errors = bias_view.compare_all(self.observed, self.remote)
+        self.assertEqual(list(corrected_by_method), list(bias_view.BIAS_METHODS))
+        self.assertEqual(errors, {})
+        for method, corrected in corrected_by_method.items():
+            pd.testing.assert_frame_equal(corrected, getattr(bias_view, method)(self.observed, self.remote))
+
+    def test_ranking_is_by_mean_rmse_over_the_columns(self):
+        corrected_by_method, errors = bias_view.compare_all(self.observed, self.remote)
+        ranking = bias_view.rank_methods(self.observed, corrected_by_method)
+        self.assertEqual([row['rank'] for row in ranking], [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(row['method'] for row in ranking), sorted(bias_view.BIAS_METHODS))
+        rmse = [row['RMSE'] for row in ranking]
+        self.assertEqual(rmse, sorted(rmse))
+        for row in ranking:
+            expected = bias_view.calculate_column_metrics(self.observed, corrected_by_method[row['method']]).mean()
+            for metric, value in expected.items():
+                self.assertAlmostEqual(row[metric], value, places=10)
+            self.assertEqual(row['name'], bias_view.BIAS_METHODS[row['method']][0])
+
+    def test_methods_without_scores_rank_last(self):
+        corrected_by_method, errors = bias_view.compare_all(self.observed, self.remote)
+        corrected_by_method['linear_scaling'] = corrected_by_method['linear_scaling'] * np.nan
+        ranking = bias_view.rank_methods(self.observed, corrected_by_method)
+        self.assertEqual(ranking[-1]['method'], 'linear_scaling')
+
+    def test_failed_methods_are_ranked_last_with_their_error(self):
+        # series of different lengths, which only some methods can correct
+        observed, remote = self.observed.iloc[:50], self.remote.iloc[:40]
+        corrected_by_method, errors = bias_view.compare_all(observed, remote)
+        self.assertEqual(sorted(corrected_by_method), ['linear_scaling', 'variance_scaling'])
+        self.assertEqual(sorted(errors), ['delta_change', 'empirical_quantile', 'quantile_mapping'])
+        ranking = bias_view.rank_methods(observed, corrected_by_method, errors)
+        self.assertEqual({row['method'] for row in ranking[:2]}, set(corrected_by_method))
+        self.assertTrue(all(row['error'] is None for row in ranking[:2]))
+        self.assertLessEqual(ranking[0]['RMSE'], ranking[1]['RMSE'])
+        for row in ranking[2:]:
+            self.assertEqual(row['error'], errors[row['method']])
+            self.assertTrue(np.isnan(row['RMSE']))
+        self.assertEqual([row['rank'] for row in ranking], [1, 2, 3, 4, 5])
+
+    def test_comparison_fails_only_if_every_method_does(self):
+        def fail(inputs):
+            raise ValueError("no data")
+
+        failing = {method: (name, fail) for method, (name, _) in bias_view.BIAS_METHODS.items()}
+        with mock.patch.dict(bias_view.BIAS_METHODS, failing), self.assertRaisesMessage(ValueError, "no data"):
+            bias_view.compare_all(self.observed, self.remote)
@@ -0,0 +1,78 @@
+import io
+import shutil
+import tempfile
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tools.benchmarks import synthetic_upload
+from tools.uploads import frame_from_columns
+from tools.views import bias_view
+from tools.views.bias_api_view import BiasCorrectionView
+
+
+def columns(frame):
+    return {"Date": frame.index.strftime('%Y-%m-%d').tolist(), "value": [None if v != v else float(v) for v in frame['value']]}
+
+
+class BiasCorrectionViewTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = self.settings(BIAS_CACHE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        observed, remote = synthetic_upload(500)
+        remote.iloc[5] = np.nan
+        self.body = {"method": "linear_scaling", "observed": columns(observed), "remote": columns(remote)}
+        # the view's float32 frames
+        self.observed, self.remote = frame_from_columns(self.body["observed"]), frame_from_columns(self.body["remote"])
+
+    def post(self, body, query='', user=User(username='pipeline')):
+        request = APIRequestFactory().post('/bias/correct/' + query, body, format='json')
+        if user is not None:
+            force_authenticate(request, user=user)
+        response = BiasCorrectionView.as_view()(request)
+        response.render()
+        return response
+
+    def test_json_answer(self):
+        response = self.post(self.body)
+        self.assertEqual(response.status_code, 200)
+        payload = response.data
+        expected = bias_view.linear_scaling(self.observed, self.remote)['value'].to_numpy()
+        np.testing.assert_allclose(np.array(payload['corrected']['value'], dtype=float), expected, equal_nan=True)
+        self.assertEqual(payload['columns'], ['value'])
+        self.assertEqual(set(payload['metrics']['after']), set(bias_view.calculate_column_metrics(self.observed, self.remote).columns))
+
+    def test_npy_and_npz_answers(self):
+        records = np.load(io.BytesIO(self.post(self.body, '?format=npy').content))
+        self.assertEqual(records.dtype.names, ('Date', 'value'))
+        self.assertEqual(len(records), len(self.remote))
+
+        with np.load(io.BytesIO(self.post(self.body, '?format=npz').content)) as arrays:
+            self.assertEqual(sorted(arrays.files), ['after', 'before', 'corrected'])
+            np.testing.assert_array_equal(arrays['corrected']['Date'], records['Date'])
+            np.testing.assert_array_equal(arrays['corrected']['value'], records['value'])
+            self.assertEqual(arrays['after']['column'].tolist(), ['value'])
+            self.assertIn('RMSE', arrays['before'].dtype.names)
+
+    def test_bootstrap_draws_are_limited(self):
+        _, obs, _ = bias_view.aligned_values(self.observed, bias_view.linear_scaling(self.observed, self.remote))
+        with self.settings(BIAS_BOOTSTRAP_MAX_DRAWS=100 * len(obs)):
+            self.assertEqual(self.post(dict(self.body, bootstrap=100)).status_code, 200)
+            response = self.post(dict(self.body, bootstrap=101))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('draws', response.data['error'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post(dict(self.body, method='nope')).status_code, 400)
+        self.assertEqual(self.post({"method": "linear_scaling", "observed": self.body["observed"]}).status_code, 400)
+        response = self.post(dict(self.body, observed={"Date": ["not a date"], "value": [1]}), '?format=npy')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_authentication_is_required(self):
+        self.assertIn(self.post(self.body, user=None).status_code, (401, 403))
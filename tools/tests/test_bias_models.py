@@ -0,0 +1,136 @@
+import json
+import shutil
+import tempfile
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from tools.benchmarks import synthetic_upload
+from tools.bias_models import apply_bias_model, fit_bias_model
+from tools.models import BiasModel
+from tools.views import bias_view
+
+
+class BiasModelFitTests(SimpleTestCase):
+    def setUp(self):
+        self.observed, self.remote = synthetic_upload(3 * 365)
+
+    def fit(self, method, **options):
+        # parameters go through JSON like the stored ones
+        return json.loads(json.dumps(fit_bias_model(method, self.observed, self.remote, **options)))
+
+    def test_reference_period_is_corrected_like_the_one_step_methods(self):
+        for method in ('linear_scaling', 'variance_scaling', 'delta_change'):
+            with self.subTest(method=method):
+                corrected = apply_bias_model(self.fit(method), self.remote)
+                expected = getattr(bias_view, method)(self.observed, self.remote)
+                np.testing.assert_allclose(corrected['value'].to_numpy(), expected['value'].to_numpy(), rtol=1e-10)
+
+    def test_full_quantile_table_is_quantile_mapping(self):
+        # one level per row puts every sorted value in the table
+        fitted = self.fit('quantile_mapping', quantiles=len(self.remote))
+        corrected = apply_bias_model(fitted, self.remote)['value'].to_numpy()
+        expected = bias_view.quantile_mapping(self.observed, self.remote)['value'].to_numpy()
+        np.testing.assert_allclose(corrected, expected, rtol=1e-9)
+        self.assertEqual(np.array(self.fit('quantile_mapping', quantiles=11)['parameters']['modeled_quantiles']).shape, (1, 11, 1))
+
+    def test_monthly_parameters_scale_each_month_on_its_own(self):
+        fitted = self.fit('linear_scaling', monthly=True)
+        self.assertEqual(np.array(fitted['parameters']['scale']).shape, (12, 1))
+        corrected = apply_bias_model(fitted, self.remote)
+        for month in (1, 7):
+            rows = self.remote.index.month == month
+            scale = self.observed['value'][rows].mean() / self.remote['value'][rows].mean()
+            np.testing.assert_allclose(corrected['value'][rows], self.remote['value'][rows] * scale, rtol=1e-6)
+
+    def test_new_data_is_matched_by_name_or_position(self):
+        fitted = self.fit('linear_scaling')
+        renamed = self.remote.rename(columns={'value': 'station'})
+        corrected = apply_bias_model(fitted, renamed)
+        self.assertEqual(list(corrected.columns), ['value'])
+        with self.assertRaises(ValueError):
+            apply_bias_model(fitted, renamed.assign(other=1.0))
+
+    def test_unfittable_requests(self):
+        with self.assertRaises(ValueError):
+            self.fit('empirical_quantile')
+        with self.assertRaises(ValueError):
+            self.fit('delta_change', monthly=True)
+        with self.assertRaises(ValueError):
+            self.fit('quantile_mapping', quantiles=1)
+
+
+class BiasModelViewTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = self.settings(BIAS_CACHE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.owner = User.objects.create_user('owner')
+        self.other = User.objects.create_user('other')
+        self.observed, self.remote = synthetic_upload(400)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def files(self, **fields):
+        return dict(
+            fields,
+            observations_file=SimpleUploadedFile('observed.csv', self.observed.to_csv().encode()),
+            remote_sensing_file=SimpleUploadedFile('remote.csv', self.remote.to_csv().encode()),
+        )
+
+    def fit(self, user, **fields):
+        return self.client_for(user).post(reverse('bias-models'), self.files(**fields), format='multipart')
+
+    def test_fit_refit_apply_and_delete(self):
+        response = self.fit(self.owner, name='lake', project='north', method='linear_scaling')
+        self.assertEqual(response.status_code, 201)
+        model_id = response.data['id']
+        self.assertEqual(response.data['columns'], ['value'])
+        self.assertEqual(str(response.data['reference_start']), '1900-01-01')
+
+        response = self.fit(self.owner, name='lake', project='north', method='variance_scaling')
+        self.assertEqual((response.status_code, response.data['id']), (200, model_id))
+
+        client = self.client_for(self.owner)
+        upload = SimpleUploadedFile('remote.csv', self.remote.to_csv().encode())
+        response = client.post(reverse('bias-model-apply', args=[model_id]), {'remote_sensing_file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        expected = bias_view.variance_scaling(self.observed, self.remote)['value'].to_numpy()
+        np.testing.assert_allclose(np.array(response.data['value'], dtype=float), expected, rtol=1e-5)
+
+        self.assertEqual(client.delete(reverse('bias-model', args=[model_id])).status_code, 204)
+        self.assertFalse(BiasModel.objects.exists())
+
+    def test_models_are_scoped_to_their_owner(self):
+        model_id = self.fit(self.owner, name='lake', method='linear_scaling').data['id']
+        self.assertEqual(self.fit(self.other, name='lake', method='linear_scaling').status_code, 201)
+
+        client = self.client_for(self.other)
+        self.assertEqual(len(client.get(reverse('bias-models')).data['models']), 1)
+        self.assertEqual(client.get(reverse('bias-model', args=[model_id])).status_code, 404)
+        self.assertEqual(client.delete(reverse('bias-model', args=[model_id])).status_code, 404)
+        upload = SimpleUploadedFile('remote.csv', self.remote.to_csv().encode())
+        response = client.post(reverse('bias-model-apply', args=[model_id]), {'remote_sensing_file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(BiasModel.objects.filter(id=model_id, owner=self.owner).exists())
+
+    def test_project_filter_and_authentication(self):
+        self.fit(self.owner, name='a', project='north', method='linear_scaling')
+        self.fit(self.owner, name='b', project='south', method='linear_scaling')
+        response = self.client_for(self.owner).get(reverse('bias-models'), {'project': 'south'})
+        self.assertEqual([m['name'] for m in response.data['models']], ['b'])
+        self.assertIn(APIClient().get(reverse('bias-models')).status_code, (401, 403))
+
+    def test_invalid_fits_are_rejected(self):
+        self.assertEqual(self.fit(self.owner, name='lake', method='empirical_quantile').status_code, 400)
+        self.assertEqual(self.fit(self.owner, name='lake', method='delta_change', monthly=True).status_code, 400)
+        self.assertFalse(BiasModel.objects.exists())
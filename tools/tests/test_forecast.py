@@ -0,0 +1,399 @@
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from tools.tests.fixtures import synthetic_forecast_inputs
+from tools.views import api_code
+
+
+class ConcurrentForecastTests(SimpleTestCase):
+    def setUp(self):
+        self.training_data, model_output = synthetic_forecast_inputs()
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=api_code.ForecastResources(model_output, 'synthetic', self.training_data),
+            trajectory_cache=api_code.TrajectoryCache(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_forecast(self, start, end):
+        results = api_code.forecast(start, end, self.training_data)
+        return [(r['Date'], r['Lake_Level']) for r in results]
+
+    def test_parallel_requests_match_serial(self):
+        ranges = []
+        for i in range(32):
+            start = {'year': 2014 + i % 4, 'month': 1 + i % 12, 'day': 1}
+            end = {'year': 2018 + i % 7, 'month': 1 + i % 12, 'day': 15}
+            ranges.append((start, end))
+
+        serial = [self.run_forecast(start, end) for start, end in ranges]
+        api_code.trajectory_cache.clear()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            parallel = list(pool.map(lambda r: self.run_forecast(*r), ranges))
+
+        self.assertEqual(parallel, serial)
+        self.assertNotIn('split', self.training_data.columns)
+
+    def test_identical_requests_are_coalesced(self):
+        start = {'year': 2016, 'month': 1, 'day': 1}
+        end = {'year': 2030, 'month': 1, 'day': 1}
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda _: self.run_forecast(start, end), range(16)))
+
+        self.assertTrue(all(r == results[0] for r in results))
+        stats = api_code.trajectory_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 15)
+
+
+class BlockForecastTests(SimpleTestCase):
+    def test_blocks_match_per_row_shifted_lag(self):
+        # reference: one row at a time, lag_Lake_Level being Lake_Level.shift(horizon) over history + forecast
+        training_data, model_output = synthetic_forecast_inputs(years=2)
+        resources = api_code.ForecastResources(model_output, 'synthetic', training_data)
+        features = model_output['features']
+        lag_col = features.index('lag_Lake_Level')
+        horizon, days = 30, 95
+        dates = pd.date_range(training_data.max_date + pd.Timedelta(days=1), periods=days, freq='D')
+        rows = api_code._calendar_features(dates, features, training_data.min_date.year)
+        series = list(training_data.levels)
+        for row in rows:
+            row[lag_col] = series[-horizon]
+            predictions = [np.exp(model.predict(row[None])[0]) for model in model_output['models']]
+            series.append(float(np.dot(model_output['weights'], predictions)))
+        expected = np.array(series[len(training_data):])
+
+        with mock.patch.object(api_code, '_ensemble_pool', False):
+            levels = api_code._extend_levels(resources, training_data, np.empty(0), days, horizon)
+
+        np.testing.assert_allclose(levels, expected, rtol=1e-12)
+
+
+class ForecastStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.training_data, model_output = synthetic_forecast_inputs(years=2)
+        self.training_data.resources = api_code.ForecastResources(model_output, 'synthetic', self.training_data)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'store.npy')
+
+    def test_rewrite_switches_levels_and_metadata_together(self):
+        first = api_code.write_forecast_store(self.path, self.training_data, 200, horizon=30)
+        second = api_code.write_forecast_store(self.path, self.training_data, 300, horizon=30)
+        third = api_code.write_forecast_store(self.path, self.training_data, 100, horizon=30)
+
+        store = api_code.load_forecast_store(self.path)
+        self.assertEqual(store.meta, third)
+        self.assertEqual(len(store.levels), 100)
+        # the previous version stays for readers that just read its metadata, older ones are removed
+        files = sorted(f for f in os.listdir(os.path.dirname(self.path)) if f.endswith('.npy'))
+        self.assertEqual(files, sorted([second['data_file'], third['data_file']]))
+        self.assertNotIn(first['data_file'], files)
+
+    def test_mismatched_metadata_is_rejected(self):
+        meta = api_code.write_forecast_store(self.path, self.training_data, 200, horizon=30)
+        with open(api_code._store_meta_path(self.path), 'w') as f:
+            json.dump(dict(meta, days=150), f)
+        self.assertIsNone(api_code.load_forecast_store(self.path))
+
+
+class FeatureNameTests(SimpleTestCase):
+    def fitted(self, columns):
+        from sklearn.linear_model import LinearRegression
+
+        X = pd.DataFrame(np.random.default_rng(0).normal(size=(20, len(columns))), columns=columns)
+        return LinearRegression().fit(X, X.sum(axis=1))
+
+    def test_models_fitted_on_other_columns_are_refused(self):
+        training_data, model_output = synthetic_forecast_inputs(years=1)
+        model_output = dict(model_output, models=[self.fitted(['b', 'a'])], features=['a', 'b'])
+        with self.assertRaises(ValueError):
+            api_code.ForecastResources(model_output, 'synthetic', training_data)
+
+    def test_warning_is_only_silenced_around_predict(self):
+        import warnings
+
+        model = self.fitted(['a', 'b'])
+        predict = api_code.array_predictor(model)
+        X = np.ones((3, 2), dtype='float32')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            predict(X)
+            self.assertEqual(caught, [])
+            model.predict(X)
+            self.assertTrue(any('valid feature names' in str(w.message) for w in caught))
+
+
+class EnsembleThreadPoolTests(SimpleTestCase):
+    def test_parallel_members_match_serial_sum(self):
+        training_data, model_output = synthetic_forecast_inputs()
+        features = model_output['features']
+        models = model_output['models'] * 3
+        weights = np.linspace(0.05, 0.3, len(models))
+        resources = api_code.ForecastResources(dict(model_output, models=models), 'synthetic', training_data)
+        store = api_code.get_feature_store(tuple(features), training_data.min_date, training_data.max_date)
+        X = store.rows(training_data.max_date, training_data.max_date + pd.Timedelta(days=119))
+        X[:, features.index('lag_Lake_Level')] = training_data.levels[-120:]
+
+        with mock.patch.object(api_code, '_ensemble_pool', False):
+            serial = api_code._predict_ensemble(X, resources.predictors, weights)
+        with mock.patch.object(api_code, '_ensemble_pool', ThreadPoolExecutor(max_workers=4)) as pool:
+            parallel = api_code._predict_ensemble(X, resources.predictors, weights)
+            pool.shutdown()
+
+        self.assertTrue(np.array_equal(parallel, serial))
+
+    def test_workers_limit_their_own_openmp_threads(self):
+        import lightgbm  # noqa: F401, loads an OpenMP runtime
+        from threadpoolctl import threadpool_info
+
+        def openmp_threads():
+            return {info['num_threads'] for info in threadpool_info() if info['user_api'] == 'openmp'}
+
+        if not openmp_threads():
+            self.skipTest("no OpenMP runtime loaded")
+        with self.settings(FORECAST_ENSEMBLE_THREADS=2, FORECAST_LIBRARY_THREADS=3), \
+                mock.patch.object(api_code, '_ensemble_pool', None):
+            pool = api_code._ensemble_executor()
+            self.addCleanup(pool.shutdown)
+            self.assertEqual(pool.submit(openmp_threads).result(), {3})
+
+
+class ForecastJobTests(SimpleTestCase):
+    def setUp(self):
+        from tools.views import jobs_view
+
+        self.jobs_view = jobs_view
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = self.settings(FORECAST_JOBS_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.training_data, model_output = synthetic_forecast_inputs(years=2)
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=api_code.ForecastResources(model_output, 'synthetic', self.training_data),
+            trajectory_cache=api_code.TrajectoryCache(),
+            reload_resources=mock.DEFAULT,
+            get_training_data=mock.Mock(return_value=self.training_data),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = mock.Mock()
+        patcher = mock.patch.object(jobs_view, 'job_pool', return_value=self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, end):
+        return self.jobs_view.submit_forecast_job({'year': 2011, 'month': 6, 'day': 1}, end, horizon=120)
+
+    def test_progress_counts_days_across_a_cached_prefix(self):
+        # a cached trajectory of 150 days makes the job's blocks 120, 30, 120, ...
+        api_code.forecast_arrays({'year': 2011, 'month': 6, 'day': 1}, {'year': 2012, 'month': 5, 'day': 30}, self.training_data, 120)
+        job = self.submit({'year': 2013, 'month': 1, 'day': 30})
+        progress = []
+        write_job = self.jobs_view._write_job
+        with mock.patch.object(self.jobs_view, '_write_job', side_effect=lambda j: (progress.append(j['days_done']), write_job(j))):
+            self.jobs_view.run_forecast_job(job['id'])
+
+        job = self.jobs_view.read_job(job['id'])
+        self.assertEqual(job['status'], 'done', job['error'])
+        self.assertEqual(job['days_total'], 396)
+        self.assertEqual(progress[-1], 396)
+        self.assertEqual(progress, sorted(progress))
+        self.assertLessEqual(max(progress), job['days_total'])
+
+    def die(self, job, **fields):
+        # the job as a worker on this host left it when it died
+        with open(self.jobs_view._job_path(job['id'], '.lock'), 'w') as f:
+            f.write(f"{socket.gethostname()} {2 ** 22 + 1}")
+        self.jobs_view._write_job(dict(self.jobs_view.read_job(job['id']), status='running', **fields))
+
+    def test_job_of_a_dead_worker_is_requeued_then_failed(self):
+        job = self.submit({'year': 2013, 'month': 1, 'day': 30})
+        self.pool.submit.reset_mock()
+        self.die(job, attempts=1, days_done=240)
+        self.jobs_view.recover_stale_jobs()
+        self.assertEqual(self.jobs_view.read_job(job['id'])['status'], 'queued')
+        self.assertEqual(sorted(os.listdir(self.jobs_view.jobs_dir())), [f"{job['id']}.json"])
+        self.pool.submit.assert_called_once_with(self.jobs_view.run_forecast_job, job['id'])
+
+        # the retry counts its days from 0
+        progress = []
+        write_job = self.jobs_view._write_job
+        with mock.patch.object(self.jobs_view, '_write_job', side_effect=lambda j: (progress.append(j['days_done']), write_job(j))):
+            self.jobs_view.run_forecast_job(job['id'])
+        job = self.jobs_view.read_job(job['id'])
+        self.assertEqual((job['status'], job['attempts']), ('done', 2))
+        self.assertEqual(progress[0], 0)
+        self.assertLessEqual(max(progress), job['days_total'])
+        self.assertEqual(progress[-1], job['days_total'])
+
+        self.die(job, attempts=2, days_done=120)
+        self.jobs_view.recover_stale_jobs()
+        self.assertEqual(self.jobs_view.read_job(job['id'])['status'], 'failed')
+        self.pool.submit.assert_called_once()
+
+    def test_only_one_poller_takes_over_a_stale_lock(self):
+        job = self.submit({'year': 2012, 'month': 3, 'day': 1})
+        self.pool.submit.reset_mock()
+        self.die(job, attempts=1)
+        stale_owner = self.jobs_view._lock_owner(job['id'])
+        stale_job = self.jobs_view.read_job(job['id'])
+        # the first poller requeues the job and a worker claims it again
+        self.jobs_view.recover_stale_jobs()
+        self.assertTrue(self.jobs_view._claim_job(job['id']))
+        claimed = self.jobs_view._lock_owner(job['id'])
+
+        # a second poller that looked at the lock before all that, and acts on what it saw
+        lock_owner = self.jobs_view._lock_owner
+        seen = lambda job_id, path=None: stale_owner if path is None else lock_owner(job_id, path)
+        with mock.patch.object(self.jobs_view, '_lock_owner', side_effect=seen):
+            self.jobs_view._recover_stale_job(stale_job, self.pool)
+
+        self.assertEqual(self.jobs_view._lock_owner(job['id']), claimed)
+        self.assertEqual(sorted(os.listdir(self.jobs_view.jobs_dir())), [f"{job['id']}.json", f"{job['id']}.lock"])
+        self.pool.submit.assert_called_once()
+
+    def test_lock_of_a_live_worker_is_kept_until_it_goes_quiet(self):
+        job = self.submit({'year': 2012, 'month': 3, 'day': 1})
+        self.assertTrue(self.jobs_view._claim_job(job['id']))
+        self.jobs_view.recover_stale_jobs()
+        self.assertEqual(self.jobs_view.read_job(job['id'])['status'], 'queued')
+        self.assertTrue(os.path.exists(self.jobs_view._job_path(job['id'], '.lock')))
+        with self.settings(FORECAST_JOB_STALE_AFTER=-1):
+            self.jobs_view.recover_stale_jobs()
+        self.assertFalse(os.path.exists(self.jobs_view._job_path(job['id'], '.lock')))
+
+    def test_missing_result_is_gone(self):
+        from django.test import RequestFactory
+
+        job = self.submit({'year': 2012, 'month': 3, 'day': 1})
+        self.jobs_view.run_forecast_job(job['id'])
+        os.remove(self.jobs_view._job_path(job['id'], '.npy'))
+        response = self.jobs_view.ForecastJobResultView.as_view()(RequestFactory().get('/'), job_id=job['id'])
+        self.assertEqual(response.status_code, 410)
+
+
+class ForecastFormatTests(SimpleTestCase):
+    def setUp(self):
+        self.training_data, model_output = synthetic_forecast_inputs(years=2)
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=api_code.ForecastResources(model_output, 'synthetic', self.training_data),
+            trajectory_cache=api_code.TrajectoryCache(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # straddles the last training date, 2011-12-31
+        self.body = {"start_year": 2011, "start_month": 12, "start_day": 1, "end_year": 2012, "end_month": 6, "end_day": 30}
+
+    def post(self, body, query=''):
+        from rest_framework.test import APIRequestFactory
+
+        response = api_code.ForecastLakeLevelsView.as_view()(APIRequestFactory().post('/forecast/' + query, body, format='json'))
+        if not response.streaming:
+            response.render()
+        return response
+
+    def test_formats_hold_the_same_rows(self):
+        rows = self.post(self.body).data['forecast']
+        dates = [r['Date'] for r in rows]
+        levels = [r['Lake_Level'] for r in rows]
+        self.assertEqual((dates[0], dates[-1]), ('2011-12-01', '2012-06-30'))
+
+        records = np.load(io.BytesIO(self.post(self.body, '?format=npy').content))
+        self.assertEqual(records.dtype.names, ('Date', 'Lake_Level'))
+        self.assertEqual(records['Date'].astype(str).tolist(), dates)
+        self.assertEqual(records['Lake_Level'].tolist(), levels)
+
+        columnar = json.loads(self.post(self.body, '?format=columnar').content)
+        self.assertEqual((columnar['start'], columnar['freq']), ('2011-12-01', 'D'))
+        self.assertEqual(columnar['Lake_Level'], levels)
+
+        lines = b''.join(self.post(self.body, '?format=ndjson').streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], rows)
+
+    def test_ndjson_streams_history_before_computing_the_forecast(self):
+        with mock.patch.object(api_code, '_predict_ensemble', wraps=api_code._predict_ensemble) as predict:
+            chunks = iter(self.post(self.body, '?format=ndjson').streaming_content)
+            predict.assert_not_called()
+            history = next(chunks)
+            # the 31 December rows come from the training data, no block has been computed yet
+            predict.assert_not_called()
+            lines = history.decode().splitlines()
+            self.assertEqual(len(lines), 31)
+            rest = []
+            for chunk in chunks:
+                # one forecast block of up to 120 days per chunk, each computed as it is read
+                rest.append(chunk)
+                self.assertEqual(predict.call_count, len(rest))
+                self.assertTrue(chunk.endswith(b'\n'))
+                lines += chunk.decode().splitlines()
+        self.assertEqual([len(chunk.splitlines()) for chunk in rest], [120, 62])
+
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(rows, json.loads(self.post(self.body).content)['forecast'])
+
+    def test_errors_stay_json_in_binary_formats(self):
+        response = self.post(dict(self.body, end_year=2011, end_month=1), '?format=npy')
+        self.assertGreaterEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('End Date', json.loads(response.content)['error'])
+
+
+class ForecastBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.training_data, model_output = synthetic_forecast_inputs(years=2)
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=api_code.ForecastResources(model_output, 'synthetic', self.training_data),
+            trajectory_cache=api_code.TrajectoryCache(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # history only, straddling the last training date (2011-12-31), future only
+        self.ranges = [
+            ({'year': 2010, 'month': 3, 'day': 1}, {'year': 2010, 'month': 9, 'day': 1}),
+            ({'year': 2011, 'month': 10, 'day': 1}, {'year': 2012, 'month': 8, 'day': 15}),
+            ({'year': 2013, 'month': 2, 'day': 1}, {'year': 2013, 'month': 2, 'day': 28}),
+        ]
+
+    def test_ranges_match_single_forecasts_from_one_trajectory(self):
+        with mock.patch.object(api_code, '_future_levels', wraps=api_code._future_levels) as future_levels:
+            batch = api_code.forecast_batch(self.ranges, self.training_data)
+        future_levels.assert_called_once()
+        api_code.trajectory_cache.clear()
+        for (start, end), results in zip(self.ranges, batch):
+            self.assertEqual(results, api_code.forecast(start, end, self.training_data))
+
+    def test_view(self):
+        from rest_framework.test import APIRequestFactory
+
+        def post(body):
+            request = APIRequestFactory().post('/forecast/batch/', body, format='json')
+            return api_code.ForecastBatchView.as_view()(request)
+
+        def fields(start, end):
+            return {f"{prefix}_{part}": date[part] for prefix, date in (('start', start), ('end', end)) for part in ('year', 'month', 'day')}
+
+        response = post({"ranges": [fields(*r) for r in self.ranges]})
+        self.assertEqual(response.status_code, 200)
+        forecasts = response.data['forecasts']
+        self.assertEqual([(f['start'], f['end']) for f in forecasts], [
+            ('2010-03-01', '2010-09-01'), ('2011-10-01', '2012-08-15'), ('2013-02-01', '2013-02-28'),
+        ])
+        self.assertEqual(forecasts[2]['forecast'][0]['Date'], '2013-02-01')
+        self.assertEqual(len(forecasts[2]['forecast']), 28)
+        self.assertEqual(post({"ranges": []}).status_code, 400)
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from tools import instrumentation
+from tools.tests.fixtures import synthetic_forecast_inputs
+from tools.views import api_code
+
+MIDDLEWARE = ['tools.instrumentation.InstrumentationMiddleware']
+
+
+@override_settings(ROOT_URLCONF='tools.urls', MIDDLEWARE=MIDDLEWARE)
+class InstrumentationMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        training_data, model_output = synthetic_forecast_inputs(years=2)
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=api_code.ForecastResources(model_output, 'synthetic', training_data),
+            trajectory_cache=api_code.TrajectoryCache(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+        # straddles the last training date, 2011-12-31, so the model runs
+        self.body = {"start_year": 2011, "start_month": 12, "start_day": 1, "end_year": 2012, "end_month": 6, "end_day": 30}
+
+    def forecast(self):
+        response = self.client.post('/forecast/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def metrics(self):
+        # {stage: count} from the livwa_stage_seconds_count lines of /metrics/
+        counts = {}
+        for line in self.client.get('/metrics/').content.decode().splitlines():
+            if line.startswith('livwa_stage_seconds_count'):
+                labels, count = line.split(' ')
+                counts[labels.split('"')[1]] = int(count)
+        return counts
+
+    @override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SERVER_TIMING=True)
+    def test_stages_of_a_request_are_timed(self):
+        expected = ['forecast.features', 'forecast.inference', 'forecast.records', 'forecast.serialize', 'render', 'request.forecast-lake-levels']
+        header = self.forecast()['Server-Timing']
+        stages = dict(entry.split(';dur=') for entry in header.split(', '))
+        self.assertEqual(sorted(stages), expected)
+        self.assertTrue(all(float(duration) >= 0 for duration in stages.values()))
+
+        first = self.metrics()
+        self.assertEqual(sorted(first), expected)
+        self.assertEqual(first['request.forecast-lake-levels'], 1)
+        # the second request reuses the cached trajectory, so the model stages are not run again
+        self.forecast()
+        counts = self.metrics()
+        self.assertEqual(counts['request.forecast-lake-levels'], 2)
+        self.assertEqual(counts['render'], 2)
+        self.assertEqual(counts['forecast.inference'], first['forecast.inference'])
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_header_needs_its_own_setting(self):
+        self.assertFalse(self.forecast().has_header('Server-Timing'))
+        self.assertEqual(self.metrics()['request.forecast-lake-levels'], 1)
+
+    @override_settings(INSTRUMENTATION_ENABLED=False, INSTRUMENTATION_SERVER_TIMING=True)
+    def test_nothing_is_recorded_when_disabled(self):
+        self.assertFalse(self.forecast().has_header('Server-Timing'))
+        self.assertEqual(self.metrics(), {})
+        self.assertIs(instrumentation.stage('forecast.inference'), instrumentation.stage('render'))
@@ -0,0 +1,56 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from tools.tests.fixtures import LagModel, synthetic_forecast_inputs
+from tools.views import api_code
+
+
+class ReloadTests(SimpleTestCase):
+    def setUp(self):
+        self.old = self.resources('old')
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=self.old,
+            trajectory_cache=api_code.TrajectoryCache(),
+            _source_signature=mock.Mock(return_value='old'),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start = {'year': 2011, 'month': 12, 'day': 1}
+        self.end = {'year': 2012, 'month': 6, 'day': 1}
+
+    def resources(self, fingerprint, damping=0.998):
+        training_data, model_output = synthetic_forecast_inputs(years=2)
+        model_output = dict(model_output, models=[LagModel(model_output['features'], damping)], weights=np.array([1.0]))
+        resources = api_code.ForecastResources(model_output, fingerprint, training_data)
+        resources.source_signature = fingerprint
+        training_data.resources = resources
+        return resources
+
+    def levels(self, training_data):
+        return [r['Lake_Level'] for r in api_code.forecast(self.start, self.end, training_data)]
+
+    def test_unchanged_files_are_not_reloaded(self):
+        with mock.patch.object(api_code, 'load_resources') as load_resources:
+            self.assertFalse(api_code.reload_resources())
+        load_resources.assert_not_called()
+
+    def test_changed_files_swap_resources_and_drop_old_trajectories(self):
+        old_levels = self.levels(self.old.training_data)
+        new = self.resources('new', damping=0.99)
+        api_code._source_signature.return_value = 'new'
+        with mock.patch.object(api_code, 'load_resources', return_value=new):
+            self.assertTrue(api_code.reload_resources())
+        self.assertIs(api_code.get_resources(), new)
+        self.assertEqual(api_code.trajectory_cache.stats()['entries'], 0)
+        # a request that started on the old snapshot finishes on the old model
+        self.assertEqual(self.levels(self.old.training_data), old_levels)
+        self.assertNotEqual(self.levels(new.training_data), old_levels)
+
+    def test_failed_smoke_forecast_keeps_the_current_resources(self):
+        broken = self.resources('broken', damping=float('nan'))
+        with mock.patch.object(api_code, 'load_resources', return_value=broken):
+            self.assertFalse(api_code.reload_resources(force=True))
+        self.assertIs(api_code.get_resources(), self.old)
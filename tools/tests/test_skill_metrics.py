@@ -0,0 +1,74 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from tools.skill_metrics import METRICS, bootstrap_intervals, skill_scores
+
+
+def reference_scores(observed, modeled):
+    # the per-column formulas of the original calculate_metrics(), on the pairs where both values are present
+    valid = ~(np.isnan(observed) | np.isnan(modeled))
+    obs, mod = observed[valid], modeled[valid]
+    diff = mod - obs
+    r = np.corrcoef(mod, obs)[0, 1]
+    alpha = np.std(mod) / np.std(obs)
+    beta = np.mean(mod) / np.mean(obs)
+    return {
+        'RMSE': np.sqrt(np.mean(diff ** 2)),
+        'MAE': np.mean(np.abs(diff)),
+        'Bias': np.mean(diff),
+        'Correlation': r,
+        'NSE': 1 - np.sum(diff ** 2) / np.sum((obs - obs.mean()) ** 2),
+        'KGE': 1 - np.sqrt((r - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2),
+    }
+
+
+class SkillScoreTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # levels far from 0, where naive sums of squares lose precision
+        self.observed = 1000 + rng.normal(0, 1, size=(400, 3))
+        self.modeled = self.observed * 1.01 + rng.normal(0, 0.5, size=(400, 3))
+        self.modeled[::13, 0] = np.nan
+        self.observed[::29, 2] = np.nan
+
+    def test_matches_the_per_column_formulas(self):
+        scores = skill_scores(self.observed, self.modeled)
+        self.assertEqual(set(scores), set(METRICS))
+        for j in range(3):
+            for metric, value in reference_scores(self.observed[:, j], self.modeled[:, j]).items():
+                self.assertAlmostEqual(scores[metric][j], value, places=9, msg=f"{metric} of column {j}")
+
+    def test_one_dimensional_inputs_give_floats(self):
+        scores = skill_scores(self.observed[:, 0], self.modeled[:, 0])
+        self.assertIsInstance(scores['KGE'], float)
+        self.assertAlmostEqual(scores['RMSE'], reference_scores(self.observed[:, 0], self.modeled[:, 0])['RMSE'], places=9)
+
+    def test_extra_axes_score_every_series(self):
+        # (rows, columns, methods) against observed broadcast over the methods
+        modeled = np.stack([self.modeled, self.modeled + 1], axis=-1)
+        scores = skill_scores(self.observed[:, :, None], modeled)
+        self.assertEqual(scores['NSE'].shape, (3, 2))
+        np.testing.assert_allclose(scores['Bias'][:, 1] - scores['Bias'][:, 0], 1, rtol=1e-9)
+
+    def test_series_without_pairs_are_nan(self):
+        modeled = self.modeled.copy()
+        modeled[:, 1] = np.nan
+        scores = skill_scores(self.observed, modeled)
+        self.assertTrue(all(np.isnan(scores[metric][1]) for metric in METRICS))
+
+    def test_bootstrap_matches_scoring_each_resample(self):
+        samples, confidence = 50, 0.9
+        intervals = bootstrap_intervals(self.observed, self.modeled, samples=samples, confidence=confidence, seed=3, batch_size=samples)
+        # the same draws, one resample at a time
+        draws = np.random.default_rng(3).integers(0, len(self.observed), size=(samples, len(self.observed)))
+        resampled = [skill_scores(self.observed[d], self.modeled[d]) for d in draws]
+        for metric in METRICS:
+            values = np.stack([scores[metric] for scores in resampled])
+            low, high = np.percentile(values, [5, 95], axis=0)
+            np.testing.assert_allclose(intervals[metric][0], low, rtol=1e-9)
+            np.testing.assert_allclose(intervals[metric][1], high, rtol=1e-9)
+
+    def test_bootstrap_batches_do_not_change_the_intervals_shape(self):
+        intervals = bootstrap_intervals(self.observed, self.modeled, samples=30, seed=1, batch_size=7)
+        self.assertEqual(intervals['RMSE'][0].shape, (3,))
+        self.assertTrue(np.all(intervals['RMSE'][0] <= intervals['RMSE'][1]))
@@ -0,0 +1,68 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from tools import upload_cache
+from tools.benchmarks import synthetic_upload
+from tools.uploads import read_upload
+
+
+class UploadCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = self.settings(BIAS_CACHE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = upload_cache.DiskCache(self.directory, max_bytes=250, suffix='.bin')
+        for i, key in enumerate(('a', 'b', 'c')):
+            cache.store(key, lambda f: f.write(b'x' * 100))
+            # mtimes an hour apart, so the order doesn't depend on the clock's resolution
+            os.utime(cache.path(key), (time.time() - 3600 * (3 - i),) * 2)
+        self.assertIsNone(cache.lookup('a'))
+        self.assertIsNotNone(cache.lookup('b'))  # now the most recently used
+        cache.store('d', lambda f: f.write(b'x' * 100))
+        self.assertIsNone(cache.lookup('c'))
+        self.assertEqual(sorted(os.listdir(self.directory)), ['b.bin', 'd.bin'])
+
+    def test_cached_frame_matches_a_fresh_read(self):
+        # Excel gives numeric headers as ints
+        observed, _ = synthetic_upload(100)
+        observed = observed.rename(columns={'value': 2020})
+        buffer = io.BytesIO()
+        observed.to_excel(buffer)
+        upload = SimpleUploadedFile('upload.xlsx', buffer.getvalue())
+        digest = upload_cache.upload_digest(upload)
+
+        fresh = upload_cache.cached_upload(upload, digest, read_upload)
+        cached = upload_cache.cached_upload(upload, digest, lambda file: self.fail("read again"))
+        pd.testing.assert_frame_equal(cached, fresh)
+        self.assertEqual(list(cached.columns), ['2020'])
+        self.assertEqual(cached.index.name, 'Date')
+
+    def test_result_round_trip(self):
+        key = upload_cache.result_key('observed', 'remote', 'linear_scaling', 'value')
+        self.assertNotEqual(key, upload_cache.result_key('observed', 'remote', 'linear_scaling', 'other'))
+        self.assertIsNone(upload_cache.load_result(key))
+        result = {"metrics": {"RMSE": 0.5}, "column_metrics": pd.DataFrame({"RMSE": [0.5]}), "plot": np.arange(3)}
+        upload_cache.store_result(key, result)
+        loaded = upload_cache.load_result(key)
+        self.assertEqual(loaded["metrics"], result["metrics"])
+        pd.testing.assert_frame_equal(loaded["column_metrics"], result["column_metrics"])
+
+    def test_failed_store_is_reported(self):
+        output = io.StringIO()
+        with redirect_stdout(output), self.settings(BIAS_CACHE_DIR=os.devnull):
+            upload_cache.store_result('key', {})
+        self.assertIn("Could not cache bias correction result", output.getvalue())
@@ -0,0 +1,98 @@
+import io
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from tools import uploads
+from tools.benchmarks import synthetic_upload
+
+
+def csv_upload(frame, name='upload.csv'):
+    return SimpleUploadedFile(name, frame.to_csv().encode())
+
+
+class UploadReaderTests(SimpleTestCase):
+    def setUp(self):
+        self.observed, _ = synthetic_upload(1000)
+
+    def assertMatchesPandas(self, frame, source):
+        expected = pd.read_csv(io.StringIO(source.to_csv()), index_col=0, parse_dates=True)
+        # .npy dates keep their own datetime64 unit
+        self.assertTrue((frame.index == expected.index).all())
+        self.assertEqual(frame.dtypes.tolist(), [np.dtype('float32')] * expected.shape[1])
+        np.testing.assert_allclose(frame.to_numpy(), expected.to_numpy(), rtol=1e-6)
+
+    def test_chunks_of_both_readers_match_a_single_read(self):
+        for reader in ('pyarrow', 'pandas'):
+            with self.subTest(reader=reader), self.settings(BIAS_UPLOAD_CHUNK_ROWS=64), \
+                    mock.patch.object(uploads, 'pyarrow_csv', uploads.pyarrow_csv if reader == 'pyarrow' else None):
+                if reader == 'pyarrow' and uploads.pyarrow_csv is None:
+                    continue
+                self.assertMatchesPandas(uploads.read_upload(csv_upload(self.observed)), self.observed)
+
+    def test_day_first_dates_and_text_columns(self):
+        frame = self.observed.copy()
+        frame.index = frame.index.strftime('%d/%m/%Y')
+        frame['station'] = 'north'
+        result = uploads.read_upload(csv_upload(frame))
+        self.assertTrue(result.index.equals(self.observed.index))
+        self.assertEqual(list(result.columns), ['value'])
+
+    def test_excel_and_npy_uploads(self):
+        buffer = io.BytesIO()
+        self.observed.to_excel(buffer)
+        self.assertMatchesPandas(uploads.read_upload(SimpleUploadedFile('upload.xlsx', buffer.getvalue())), self.observed)
+        records = np.empty(len(self.observed), dtype=[('Date', 'datetime64[D]'), ('value', 'f8')])
+        records['Date'] = self.observed.index.to_numpy().astype('datetime64[D]')
+        records['value'] = self.observed['value'].to_numpy()
+        buffer = io.BytesIO()
+        np.save(buffer, records)
+        self.assertMatchesPandas(uploads.read_upload(SimpleUploadedFile('upload.npy', buffer.getvalue())), self.observed)
+
+    def test_limits(self):
+        with self.settings(BIAS_UPLOAD_MAX_ROWS=500, BIAS_UPLOAD_CHUNK_ROWS=100):
+            with self.assertRaisesMessage(ValueError, "more than 500 rows"):
+                uploads.read_upload(csv_upload(self.observed))
+            with self.assertRaisesMessage(ValueError, "more than 500 rows"):
+                uploads.frame_from_columns({'Date': ['2020-01-01'] * 501, 'value': [1.0] * 501})
+        with self.settings(BIAS_UPLOAD_MAX_BYTES=1000):
+            with self.assertRaisesMessage(ValueError, "the limit is"):
+                uploads.read_upload(csv_upload(self.observed))
+        with self.assertRaisesMessage(ValueError, "Unsupported file format"):
+            uploads.read_upload(SimpleUploadedFile('upload.txt', b'Date,value\n'))
+
+    @unittest.skipIf(uploads.pyarrow_csv is None, "pyarrow is not installed")
+    def test_both_readers_give_the_same_frame(self):
+        # a byte order mark, missing values, a placeholder and a text column
+        frame = self.observed.copy()
+        frame['other'] = frame['value'] * 2
+        frame.iloc[::7, 0] = np.nan
+        frame = frame.astype(object)
+        frame.iloc[3, 1] = 'n/a'
+        frame['station'] = 'north'
+        content = '\ufeff'.encode() + frame.to_csv().encode()
+        frames = {}
+        for reader in ('pyarrow', 'pandas'):
+            with self.settings(BIAS_UPLOAD_CHUNK_ROWS=64), \
+                    mock.patch.object(uploads, 'pyarrow_csv', uploads.pyarrow_csv if reader == 'pyarrow' else None):
+                frames[reader] = uploads.read_upload(SimpleUploadedFile('upload.csv', content))
+        pd.testing.assert_frame_equal(frames['pyarrow'], frames['pandas'])
+        self.assertEqual(list(frames['pandas'].columns), ['value', 'other'])
+        self.assertEqual(frames['pandas'].index.name, 'Date')
+        self.assertTrue(np.isnan(frames['pandas']['other'].iloc[3]))
+
+    @unittest.skipIf(uploads.pyarrow_csv is None, "pyarrow is not installed")
+    def test_pyarrow_blocks_may_change_type(self):
+        # more than one 1 MB block of integers, then a fraction and a placeholder
+        dates = pd.date_range('1990-01-01', periods=150_002, freq='h').strftime('%Y-%m-%d %H:%M')
+        rows = ["Date,value"] + [f"{date},{i}" for i, date in enumerate(dates[:-2])]
+        rows += [f"{dates[-2]},1.5", f"{dates[-1]},n/a"]
+        with self.settings(BIAS_UPLOAD_CHUNK_ROWS=1000):
+            result = uploads.read_upload(SimpleUploadedFile('upload.csv', "\n".join(rows).encode()))
+        self.assertEqual(len(result), 150_002)
+        self.assertEqual(result['value'].iloc[-2], 1.5)
+        self.assertTrue(np.isnan(result['value'].iloc[-1]))
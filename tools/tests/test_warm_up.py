@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from tools.tests.fixtures import synthetic_forecast_inputs
+from tools.views import api_code
+
+
+class WarmUpTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            api_code,
+            _resources=None,
+            _readiness=dict(api_code._readiness, status="cold", attempts=0, retry_at=None),
+            trajectory_cache=api_code.TrajectoryCache(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        training_data, model_output = synthetic_forecast_inputs(years=2)
+        self.resources = api_code.ForecastResources(model_output, 'synthetic', training_data)
+        self.resources.source_signature = 'current'
+
+    def health(self):
+        return api_code.HealthCheckView.as_view()(RequestFactory().get('/'))
+
+    def test_failed_warm_up_is_retried_after_its_backoff(self):
+        with mock.patch.object(api_code, 'load_resources', side_effect=FileNotFoundError("models/output.pkl")), \
+                self.settings(FORECAST_WARM_UP_RETRY_BACKOFF=60):
+            self.assertIsNone(api_code.warm_up())
+        state = api_code.readiness()
+        self.assertEqual((state['status'], state['attempts']), ("failed", 1))
+        self.assertEqual(state['retry_at'], state['finished'] + 60)
+
+        response = self.health()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['status'], "degraded")
+
+        with mock.patch('threading.Thread') as thread:
+            self.assertFalse(api_code.start_warm_up())
+            with mock.patch('time.time', return_value=state['retry_at']):
+                self.assertTrue(api_code.start_warm_up())
+        thread.assert_called_once()
+
+        with mock.patch.object(api_code, 'load_resources', return_value=self.resources), \
+                mock.patch('tools.views.levels_view.generate_plot', return_value='png'):
+            self.assertIs(api_code.warm_up(), self.resources)
+        state = api_code.readiness()
+        self.assertEqual((state['status'], state['attempts'], state['retry_at']), ("ready", 0, None))
+
+    def test_backoff_doubles_up_to_its_ceiling(self):
+        with self.settings(FORECAST_WARM_UP_RETRY_BACKOFF=5, FORECAST_WARM_UP_RETRY_MAX_BACKOFF=30):
+            self.assertEqual([api_code._warm_up_backoff(n) for n in range(1, 6)], [5, 10, 20, 30, 30])
+
+    def test_successful_reload_clears_a_failed_warm_up(self):
+        api_code._resources = self.resources
+        api_code._set_readiness(status="failed", error="plot", attempts=2, retry_at=0)
+        with mock.patch.object(api_code, 'load_resources', return_value=self.resources):
+            self.assertTrue(api_code.reload_resources(force=True))
+        state = api_code.readiness()
+        self.assertEqual((state['status'], state['error'], state['attempts']), ("ready", None, 0))
+        self.assertEqual(self.health().status_code, 200)
@@ -0,0 +1,137 @@
+# Content-addressed caches for the bias tool. Uploads are fingerprinted by
+# the sha256 of their bytes. Parsed frames are kept as uncompressed .npz files
+# (dates and one float32 array per column), so a file seen before is not
+# parsed again. Finished results (metrics, per-column metrics and the plot)
+# are kept per (observed hash, remote hash, method, variable), so a repeated
+# submission skips parsing and computation. Both live on disk under
+# BIAS_CACHE_DIR, shared by all workers, and are evicted least recently used
+# first once they exceed BIAS_FRAME_CACHE_MAX_BYTES / BIAS_RESULT_CACHE_MAX_BYTES.
+import hashlib
+import os
+import pickle
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+# bump when the parsing or the corrections change, so older entries are no longer hit
+CACHE_VERSION = 3
+
+
+class DiskCache:
+    """
+    Files under `directory`, one per key. Reading an entry marks it as
+    recently used (mtime), writes are atomic, and the least recently used
+    files are removed once the directory holds more than `max_bytes`.
+    """
+    def __init__(self, directory, max_bytes, suffix):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def lookup(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self, key, write):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, self.path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+
+    def evict(self):
+        # workers may evict concurrently, files already gone are skipped
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _cache_dir():
+    return getattr(settings, 'BIAS_CACHE_DIR', 'data/bias_cache')
+
+def frame_cache():
+    return DiskCache(os.path.join(_cache_dir(), 'frames'), getattr(settings, 'BIAS_FRAME_CACHE_MAX_BYTES', 1024 * 1024 * 1024), '.npz')
+
+def result_cache():
+    return DiskCache(os.path.join(_cache_dir(), 'results'), getattr(settings, 'BIAS_RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024), '.pkl')
+
+def upload_digest(file):
+    # sha256 of the upload, read in the upload handler's chunks; the file is rewound for parsing
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+def load_frame(digest):
+    path = frame_cache().lookup(f"v{CACHE_VERSION}-{digest}")
+    if path is None:
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        columns = [str(c) for c in data['columns']]
+        index = pd.DatetimeIndex(data['dates'], name=str(data['index_name']) or None)
+        return pd.DataFrame({c: data[f'column_{i}'] for i, c in enumerate(columns)}, index=index)
+
+def store_frame(digest, frame):
+    arrays = {f'column_{i}': frame[c].to_numpy() for i, c in enumerate(frame.columns)}
+    arrays['columns'] = np.array([str(c) for c in frame.columns], dtype=str)
+    arrays['dates'] = frame.index.to_numpy(dtype='datetime64[ns]')
+    arrays['index_name'] = np.array('' if frame.index.name is None else str(frame.index.name))
+    frame_cache().store(f"v{CACHE_VERSION}-{digest}", lambda f: np.savez(f, **arrays))
+
+def cached_upload(file, digest, read):
+    """The parsed frame of `file` from the cache, or read(file) stored in it."""
+    frame = load_frame(digest)
+    if frame is None:
+        frame = read(file)
+        try:
+            store_frame(digest, frame)
+        except OSError as e:
+            print(f"Could not cache upload {file.name}: {e}")
+    return frame
+
+def result_key(observed_digest, remote_digest, method, variable):
+    key = f"{CACHE_VERSION}\0{observed_digest}\0{remote_digest}\0{method}\0{variable}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def load_result(key):
+    path = result_cache().lookup(key)
+    if path is None:
+        return None
+    # written by store_result() in this process or another worker, never user supplied
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def store_result(key, result):
+    try:
+        result_cache().store(key, lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"Could not cache bias correction result: {e}")
@@ -0,0 +1,192 @@
+# Reading the observation and remote sensing uploads of the bias tool into
+# date-indexed float32 frames. CSV files are read in chunks of
+# BIAS_UPLOAD_CHUNK_ROWS rows, with pyarrow's streaming reader (see
+# requirements.txt) and pandas' C parser where it is not installed, so only
+# the float32 result and one chunk are in memory at a time. Both readers give
+# the same frame. .npy files hold a structured array with a
+# Date field, and API clients can send columns as JSON (frame_from_columns).
+# Size and row limits (BIAS_UPLOAD_MAX_BYTES, BIAS_UPLOAD_MAX_ROWS) are checked
+# before and while reading.
+import csv
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from pandas.tseries.api import guess_datetime_format
+
+try:
+    import pyarrow
+    from pyarrow import csv as pyarrow_csv
+except ImportError:
+    pyarrow_csv = None
+
+
+def max_upload_bytes():
+    return getattr(settings, 'BIAS_UPLOAD_MAX_BYTES', 200 * 1024 * 1024)
+
+def max_upload_rows():
+    return getattr(settings, 'BIAS_UPLOAD_MAX_ROWS', 5_000_000)
+
+def upload_chunk_rows():
+    return getattr(settings, 'BIAS_UPLOAD_CHUNK_ROWS', 100_000)
+
+def upload_date_format():
+    # format of the date column; files that don't match it get one format guessed from their first date
+    return getattr(settings, 'BIAS_DATE_FORMAT', 'ISO8601')
+
+def _check_size(file):
+    size = getattr(file, 'size', None)
+    if size is not None and size > max_upload_bytes():
+        raise ValueError(f"File is {size / 2**20:.0f} MB, the limit is {max_upload_bytes() / 2**20:.0f} MB.")
+
+def _date_format(dates, date_format):
+    # the configured format if the first chunk parses with it, else a format guessed from its first
+    # date (month or day first) that parses the whole chunk; later chunks must match it
+    first = dates.dropna()
+    candidates = [date_format]
+    if len(first):
+        candidates += [guess_datetime_format(str(first.iloc[0]), dayfirst=dayfirst) for dayfirst in (False, True)]
+    for candidate in candidates:
+        if candidate is None:
+            continue
+        try:
+            pd.to_datetime(dates, format=candidate)
+            return candidate
+        except (ValueError, TypeError):
+            pass
+    raise ValueError(f"Dates don't match the format {date_format} and no other format could be recognised.")
+
+def _csv_header(file):
+    # the column names on the first line, leaving the file at its start
+    line = file.readline()
+    file.seek(0)
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig')
+    return next(csv.reader([line]), [])
+
+def _numeric_batch(batch):
+    # value columns as float64 where every value is a number or missing; the others stay text
+    # for _float32_values() to coerce, like the pandas reader's object columns
+    columns = [batch.column(0)]
+    for column in batch.columns[1:]:
+        try:
+            column = column.cast(pyarrow.float64())
+        except pyarrow.ArrowInvalid:
+            pass
+        columns.append(column)
+    return pyarrow.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+def _csv_chunks(file, chunk_rows):
+    if pyarrow_csv is not None:
+        # every column is read as text: pyarrow fixes the types it infers from the first block
+        # and fails on a later one that doesn't fit them, e.g. "1.5" in a column of integers
+        convert_options = pyarrow_csv.ConvertOptions(
+            column_types={name: pyarrow.string() for name in _csv_header(file)},
+            strings_can_be_null=True,
+        )
+        # ~ chunk_rows rows of a few numeric columns per block
+        reader = pyarrow_csv.open_csv(
+            file,
+            read_options=pyarrow_csv.ReadOptions(block_size=max(chunk_rows * 64, 1 << 20)),
+            convert_options=convert_options,
+        )
+        for batch in reader:
+            yield _numeric_batch(batch).to_pandas()
+    else:
+        yield from pd.read_csv(file, chunksize=chunk_rows, engine='c')
+
+def _float32_values(frame):
+    return frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float32')
+
+def _frame(index_name, columns, dates, values):
+    # headers are text whatever the file made of them (Excel gives numbers as ints), like
+    # frames from the upload cache and the columns of the CSV and JSON inputs
+    index = pd.DatetimeIndex(np.concatenate(dates), name=None if index_name is None else str(index_name))
+    frame = pd.DataFrame(np.concatenate(values), index=index, columns=[str(c) for c in columns])
+    # columns with no numbers at all (names, flags) are dropped
+    return frame.dropna(axis=1, how='all')
+
+def read_csv_upload(file):
+    _check_size(file)
+    max_rows = max_upload_rows()
+    date_format = upload_date_format()
+    index_name, columns = None, None
+    dates, values = [], []
+    rows = 0
+    for chunk in _csv_chunks(file, upload_chunk_rows()):
+        if columns is None:
+            if chunk.shape[1] < 2:
+                raise ValueError("Expected a date column followed by at least one value column.")
+            index_name, columns = chunk.columns[0], list(chunk.columns[1:])
+            date_format = _date_format(chunk.iloc[:, 0], date_format)
+        rows += len(chunk)
+        if rows > max_rows:
+            raise ValueError(f"File has more than {max_rows} rows.")
+        dates.append(pd.to_datetime(chunk.iloc[:, 0], format=date_format).to_numpy())
+        values.append(_float32_values(chunk.iloc[:, 1:]))
+    if columns is None:
+        raise ValueError("File is empty.")
+    return _frame(index_name, columns, dates, values)
+
+def read_excel_upload(file):
+    # openpyxl can't be read in chunks, but nrows stops it one row past the limit
+    _check_size(file)
+    max_rows = max_upload_rows()
+    sheet = pd.read_excel(file, nrows=max_rows + 1)
+    if len(sheet) > max_rows:
+        raise ValueError(f"File has more than {max_rows} rows.")
+    if sheet.shape[1] < 2:
+        raise ValueError("Expected a date column followed by at least one value column.")
+    date_format = _date_format(sheet.iloc[:, 0], upload_date_format())
+    dates = pd.to_datetime(sheet.iloc[:, 0], format=date_format).to_numpy()
+    return _frame(sheet.columns[0], list(sheet.columns[1:]), [dates], [_float32_values(sheet.iloc[:, 1:])])
+
+def read_npy_upload(file):
+    # a structured array with a datetime64 Date field and numeric value fields, e.g. as
+    # sent back by the API's npy format
+    _check_size(file)
+    try:
+        records = np.load(file, allow_pickle=False)
+    except ValueError as e:
+        raise ValueError(f"Not a readable .npy file: {e}")
+    names = records.dtype.names or ()
+    if 'Date' not in names or len(names) < 2 or records.ndim != 1:
+        raise ValueError("Expected a 1-D structured array with a Date field and at least one value field.")
+    if len(records) > max_upload_rows():
+        raise ValueError(f"File has more than {max_upload_rows()} rows.")
+    columns = [name for name in names if name != 'Date']
+    values = np.column_stack([records[name].astype('float32') for name in columns])
+    dates = pd.to_datetime(records['Date']).to_numpy()
+    return _frame('Date', columns, [dates], [values])
+
+def frame_from_columns(columns):
+    """
+    {"Date": [...], "<column>": [...], ...} (e.g. a JSON request body) as
+    a frame like read_upload()'s, with the same row limit.
+    """
+    if not isinstance(columns, dict) or 'Date' not in columns or len(columns) < 2:
+        raise ValueError('Expected {"Date": [...], "<column>": [...]} with at least one value column.')
+    dates = columns['Date']
+    if len(dates) > max_upload_rows():
+        raise ValueError(f"Series has more than {max_upload_rows()} rows.")
+    names = [name for name in columns if name != 'Date']
+    if any(not isinstance(columns[name], list) or len(columns[name]) != len(dates) for name in names):
+        raise ValueError("Every column needs one value per date.")
+    date_format = _date_format(pd.Series(dates, dtype=object), upload_date_format())
+    index = pd.to_datetime(pd.Series(dates, dtype=object), format=date_format).to_numpy()
+    values = _float32_values(pd.DataFrame({name: columns[name] for name in names}))
+    return _frame('Date', names, [index], [values])
+
+def read_upload(file):
+    """
+    An uploaded .csv, .xlsx, .xls or .npy file as a float32 DataFrame indexed
+    by its dates. Raises ValueError for unsupported, too large or unparsable
+    files.
+    """
+    if file.name.endswith('.csv'):
+        return read_csv_upload(file)
+    elif file.name.endswith(('.xlsx', '.xls')):
+        return read_excel_upload(file)
+    elif file.name.endswith('.npy'):
+        return read_npy_upload(file)
+    raise ValueError("Unsupported file format.")
@@ -33,8 +33,8 @@
 
 
 from django.urls import path
-from tools.views import (bias_view, home_view, levels_view, reports_view)
-from tools.views.api_code import ForecastLakeLevelsView, HealthCheckView
+from tools.views import (bias_view, bias_api_view, bias_models_view, home_view, levels_view, reports_view, jobs_view)
+from tools.views.api_code import ForecastLakeLevelsView, ForecastBatchView, HealthCheckView, MetricsView, ReadinessView
 
 urlpatterns = [
     path('', home_view.home, name='home'),
@@ -48,5 +48,20 @@ urlpatterns = [
 
     # Lake levels API endpoints
     path('forecast/', ForecastLakeLevelsView.as_view(), name='forecast-lake-levels'),
+    path('forecast/batch/', ForecastBatchView.as_view(), name='forecast-batch'),
+    path('forecast/jobs/', jobs_view.ForecastJobSubmitView.as_view(), name='forecast-jobs'),
+    path('forecast/jobs/<uuid:job_id>/', jobs_view.ForecastJobView.as_view(), name='forecast-job'),
+    path('forecast/jobs/<uuid:job_id>/result/', jobs_view.ForecastJobResultView.as_view(), name='forecast-job-result'),
+
+    # Bias correction API endpoints
+    path('bias/correct/', bias_api_view.BiasCorrectionView.as_view(), name='bias-correct'),
+
+    # Fitted bias correction models
+    path('bias/models/', bias_models_view.BiasModelListView.as_view(), name='bias-models'),
+    path('bias/models/<int:model_id>/', bias_models_view.BiasModelView.as_view(), name='bias-model'),
+    path('bias/models/<int:model_id>/apply/', bias_models_view.BiasModelApplyView.as_view(), name='bias-model-apply'),
+
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    path('ready/', ReadinessView.as_view(), name='readiness'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
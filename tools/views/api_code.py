@@ -1,9 +1,26 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
 from rest_framework import status, serializers
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from collections import OrderedDict
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from threadpoolctl import threadpool_limits
+import functools
+import hashlib
+import json
+import os
 import pickle
+import signal
+import threading
+import time
+import warnings
 import numpy as np
 import pandas as pd
+from tools.instrumentation import render_metrics, stage
 
 
 # Serializer for input data
@@ -15,165 +32,1075 @@ class ForecastRequestSerializer(serializers.Serializer):
     end_month = serializers.IntegerField()
     end_day = serializers.IntegerField()
 
-# Load the trained model outputs and training data
-model_path = "models/output.pkl"
-with open(model_path, 'rb') as f:
-    model_output = pickle.load(f)
+class ForecastBatchRequestSerializer(serializers.Serializer):
+    ranges = ForecastRequestSerializer(many=True, allow_empty=False)
+
+def _date_parts(validated_data, prefix):
+    return {
+        "year": validated_data[f'{prefix}_year'],
+        "month": validated_data[f'{prefix}_month'],
+        "day": validated_data[f'{prefix}_day']
+    }
 
+# Trained model outputs and training data, loaded on first use (see get_resources)
+model_path = "models/output.pkl"
 excel_path = "data/water_levels_data.xlsx"
-try:
-    training_data = pd.read_excel(excel_path)
-    training_data = training_data.sort_values('Date')
-    cont_columns = training_data.columns.drop(['Date', 'Lake_Level'])
-    training_data[cont_columns] = np.log(training_data[cont_columns])
-    # training_data = training_data.drop(columns=['Discharge_Depth','Streamflow_Depth','Evaporation','Precipitation'])
-    training_data = training_data.dropna()
-except Exception as e:
-    training_data = None
-    print(f"Error loading training data: {e}")
+training_cache_path = "data/water_levels_data.cache.pkl"
+# touched by the reload_forecast_resources command, see reload_resources()
+reload_trigger_path = "data/reload.trigger"
+forecast_store_path = "data/forecast_store.npy"
 
-def forecast(start, end, training_data, horizon=120):
+# observed levels kept next to the snapshot for seeding forecasts, at least the longest horizon
+LEVEL_TAIL_DAYS = 366
+
+class TrainingSnapshot:
+    """
+    Read-only, date-indexed copy of the training history. Every column is held
+    as a non-writeable numpy array sorted by Date, date ranges are located with
+    searchsorted and returned as slices of those arrays, so requests never
+    scan or mutate the shared data. `tail` holds the last LEVEL_TAIL_DAYS
+    levels, all a forecast needs from the history.
+    """
+    def __init__(self, frame):
+        frame = frame.sort_values('Date')
+        # the ForecastResources this snapshot was loaded with, set by load_resources()
+        self.resources = None
+        self.columns = list(frame.columns)
+        self.arrays = {}
+        for column in self.columns:
+            values = frame[column].to_numpy(copy=True)
+            values.flags.writeable = False
+            self.arrays[column] = values
+        self.dates = self.arrays['Date']
+        self.levels = self.arrays['Lake_Level']
+        self.min_date = pd.Timestamp(self.dates[0])
+        self.max_date = pd.Timestamp(self.dates[-1])
+        self.tail = np.array(self.levels[-LEVEL_TAIL_DAYS:], dtype=float)
+        self.tail.flags.writeable = False
+        hashed = pd.util.hash_pandas_object(frame[['Date', 'Lake_Level']], index=False)
+        self.fingerprint = hashlib.sha256(hashed.to_numpy().tobytes()).hexdigest()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def bounds(self, start_date, end_date):
+        # positions [lo, hi) of the rows with start_date <= Date <= end_date
+        lo = np.searchsorted(self.dates, start_date.to_datetime64(), side='left')
+        hi = np.searchsorted(self.dates, end_date.to_datetime64(), side='right')
+        return lo, hi
+
+    def lag_seed(self, horizon, done=()):
+        # the `horizon` levels before the day after `done`, forecast levels continuing the history
+        recent = np.asarray(done[-horizon:], dtype=float)
+        if len(recent) < horizon:
+            tail = self.tail if horizon <= len(self.tail) else self.levels
+            recent = np.concatenate([tail[max(len(tail) - (horizon - len(recent)), 0):], recent])
+        return _lag_seed(recent, horizon)
+
+    def records(self, start_date, end_date):
+        return self.rows(*self.bounds(start_date, end_date))
+
+    def rows(self, lo, hi):
+        columns = {}
+        for column in self.columns:
+            if column == 'Date':
+                columns[column] = list(pd.DatetimeIndex(self.dates[lo:hi]))
+            else:
+                columns[column] = self.arrays[column][lo:hi].tolist()
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_training_data(path=excel_path, cache_path=training_cache_path):
+    """
+    Read the training workbook and log-transform it the way the model was
+    trained. The preprocessed frame is pickled to `cache_path` together with
+    the workbook's mtime, size and sha256, so openpyxl only parses the
+    workbook again when its content changes.
+    """
+    stat = os.stat(path)
+    cached = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable training data cache: {e}")
+    if cached is not None and (cached['mtime_ns'], cached['size']) == (stat.st_mtime_ns, stat.st_size):
+        return cached['frame']
+
+    digest = _file_sha256(path)
+    if cached is not None and cached['sha256'] == digest:
+        training_data = cached['frame']
+    else:
+        training_data = pd.read_excel(path)
+        training_data = training_data.sort_values('Date')
+        cont_columns = training_data.columns.drop(['Date', 'Lake_Level'])
+        training_data[cont_columns] = np.log(training_data[cont_columns])
+        # training_data = training_data.drop(columns=['Discharge_Depth','Streamflow_Depth','Evaporation','Precipitation'])
+        training_data = training_data.dropna()
+    try:
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest, "frame": training_data}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write training data cache: {e}")
+    return training_data
+
+CALENDAR_DUMMIES = ('dayofweek', 'month', 'quarter', 'week')
+FEATURE_STORE_FUTURE_DAYS = 365 * 30
+
+def _calendar_features(dates, features, year_min):
+    """
+    Float32 feature matrix for `dates` with columns in `features` order.
+    Calendar columns and their dummies are filled in, lag_Lake_Level and
+    anything that is not derived from the date is left as NaN.
+    """
+    dates = pd.DatetimeIndex(dates)
+    columns = {
+        'years_since_min': dates.year - year_min,
+        'day': dates.day,
+        'weekend': dates.dayofweek >= 5,
+        'dayofweek': dates.dayofweek,
+        'month': dates.month,
+        'quarter': dates.quarter,
+        'week': dates.isocalendar()['week'].to_numpy(dtype='int32'),
+    }
+    matrix = np.full((len(dates), len(features)), np.nan, dtype='float32')
+    for i, feature in enumerate(features):
+        name, _, value = feature.rpartition('_')
+        if feature in ('years_since_min', 'day', 'weekend'):
+            matrix[:, i] = columns[feature]
+        elif name in CALENDAR_DUMMIES and value.isdigit():
+            matrix[:, i] = columns[name] == int(value)
+    return matrix
+
+class CalendarFeatureStore:
+    """
+    Calendar features for every day from the last training date up to
+    `future_days` past it, already aligned to the model features. The first
+    training date only sets years_since_min, so the store does not grow with
+    the history. Built once per model, forecasting only slices rows out of it.
+    """
+    def __init__(self, features, first_date, last_date, future_days=FEATURE_STORE_FUTURE_DAYS):
+        self.features = list(features)
+        self.year_min = first_date.year
+        self.dates = pd.date_range(start=last_date, end=last_date + pd.Timedelta(days=future_days), freq='D')
+        self.matrix = _calendar_features(self.dates, self.features, self.year_min)
+        self.matrix.flags.writeable = False
+
+    def rows(self, start_date, end_date):
+        # copy, the caller fills in lag_Lake_Level
+        first = (start_date - self.dates[0]).days
+        last = (end_date - self.dates[0]).days + 1
+        if first >= 0 and last <= len(self.dates):
+            return self.matrix[first:last].copy()
+        dates = pd.date_range(start=start_date, end=end_date, freq='D')
+        return _calendar_features(dates, self.features, self.year_min)
+
+@functools.lru_cache(maxsize=4)
+def get_feature_store(features, first_date, last_date):
+    return CalendarFeatureStore(features, first_date, last_date)
+
+def _lag_seed(levels, horizon):
+    # the last `horizon` observed levels, back-filled like shift(horizon).bfill() when history is shorter
+    seed = np.asarray(levels[-horizon:], dtype=float)
+    return np.pad(seed, (horizon - len(seed), 0), mode='edge')
+
+def array_predictor(model):
+    """
+    Return a function predicting from a contiguous float32 matrix whose columns
+    are in `features` order, using the model library's cheapest array entry
+    point so no DataFrame is built or validated per call.
+    """
+    library = type(model).__module__.split('.')[0]
+    if library == 'xgboost':
+        if hasattr(model, 'get_booster'):
+            # the sklearn wrapper takes the inplace_predict path for numpy input
+            return lambda X: model.predict(X, validate_features=False)
+        return lambda X: model.inplace_predict(X, validate_features=False)
+    if library == 'lightgbm':
+        booster = getattr(model, 'booster_', model)
+        return lambda X: booster.predict(X)
+    # catboost and scikit-learn accept numpy arrays directly; models fitted on a DataFrame warn about the
+    # missing names, which ForecastResources already checked against `features`
+    def predict(X):
+        with warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='X does not have valid feature names', category=UserWarning)
+            return model.predict(X)
+    return predict
+
+def check_feature_names(models, features):
+    """
+    Raise ValueError if a model was fitted on columns other than `features`,
+    in that order, since predictors are given bare arrays in `features` order.
+    Models that kept no column names are not checked.
+    """
+    for i, model in enumerate(models):
+        names = getattr(model, 'feature_names_in_', None)
+        if names is not None and list(names) != list(features):
+            raise ValueError(f"Model {i} was fitted on features {list(names)}, expected {list(features)}.")
+
+_ensemble_pool = None
+_ensemble_pool_lock = threading.Lock()
+
+def _limit_library_threads(limit):
+    # OpenMP thread counts are per calling thread, so every pool worker sets its own
+    threadpool_limits(limits=limit, user_api='openmp')
+
+def _ensemble_executor():
+    """
+    Thread pool shared by all requests for running ensemble members side by
+    side; the boosting libraries release the GIL while predicting. Sized by
+    FORECAST_ENSEMBLE_THREADS (1 disables it). FORECAST_LIBRARY_THREADS caps
+    the OpenMP threads each library starts internally, through threadpoolctl
+    in every worker, so concurrent members don't oversubscribe the cores.
+    """
+    global _ensemble_pool
+    with _ensemble_pool_lock:
+        if _ensemble_pool is None:
+            cpus = os.cpu_count() or 1
+            workers = getattr(settings, 'FORECAST_ENSEMBLE_THREADS', None) or min(4, cpus)
+            if workers <= 1:
+                _ensemble_pool = False
+            else:
+                library_threads = getattr(settings, 'FORECAST_LIBRARY_THREADS', None) or max(1, cpus // workers)
+                _ensemble_pool = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='ensemble',
+                    initializer=_limit_library_threads, initargs=(library_threads,),
+                )
+        return _ensemble_pool or None
+
+def _predict_ensemble(X, predictors, weights):
+    # weighted blend of the exponentiated member predictions, computed in place in one buffer
+    predictions = np.empty((len(predictors), len(X)))
+    executor = _ensemble_executor() if len(predictors) > 1 else None
+    if executor is None:
+        for i, predict in enumerate(predictors):
+            predictions[i] = predict(X)
+    else:
+        for i, prediction in enumerate(executor.map(lambda predict: predict(X), predictors)):
+            predictions[i] = prediction
+    np.exp(predictions, out=predictions)
+    predictions *= weights[:, np.newaxis]
+    return predictions.sum(axis=0)
+
+def _iter_recursive_forecast(X, seed, predictors, weights, features, horizon):
+    """
+    Predict the rows of the float32 feature matrix X one block of `horizon`
+    days at a time, yielding each block of levels as soon as it is known.
+    lag_Lake_Level is Lake_Level shifted by `horizon`, so a block only
+    depends on the block before it (or on `seed`, the last observed levels,
+    for the first block) and costs a single predict call per model.
+    """
+    lag_col = features.index('lag_Lake_Level')
+    levels = np.concatenate([seed, np.empty(len(X))])
+    for block_start in range(0, len(X), horizon):
+        block_end = min(block_start + horizon, len(X))
+        X[block_start:block_end, lag_col] = levels[block_start:block_end]
+        with stage('forecast.inference'):
+            levels[horizon + block_start:horizon + block_end] = _predict_ensemble(X[block_start:block_end], predictors, weights)
+        yield levels[horizon + block_start:horizon + block_end]
+
+def _recursive_forecast(X, seed, predictors, weights, features, horizon):
+    return np.concatenate([seed[:0], *_iter_recursive_forecast(X, seed, predictors, weights, features, horizon)])
+
+class TrajectoryCache:
+    """
+    Future Lake_Level trajectories keyed by (model fingerprint, data
+    fingerprint, horizon). An entry holds the longest series computed so far,
+    starting the day after the last training date: shorter requests slice it,
+    longer ones extend it from where it stops. Least recently used entries
+    are evicted once the stored values exceed `max_bytes`.
+
+    Safe to share between threads; key_lock() gives one lock per key so that
+    only one request computes a trajectory while identical ones wait for it.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            levels = self._entries.get(key)
+            if levels is not None:
+                self._entries.move_to_end(key)
+            return levels
+
+    def put(self, key, levels):
+        levels.flags.writeable = False
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and len(current) > len(levels):
+                return
+            self._entries[key] = levels
+            self._entries.move_to_end(key)
+            while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    @property
+    def nbytes(self):
+        return sum(levels.nbytes for levels in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, current):
+        # drop the trajectories of every (model fingerprint, data fingerprint) other than `current`
+        with self._lock:
+            for key in [key for key in self._entries if key[:2] != current]:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+trajectory_cache = TrajectoryCache()
+
+class ForecastStore:
+    """
+    Future trajectory precomputed by the precompute_forecast management
+    command, memory-mapped read-only so every worker shares one page-cache
+    copy of it. The .json metadata names the versioned data file it was
+    written with, so metadata and levels are always read as a pair.
+    """
+    def __init__(self, path):
+        with open(_store_meta_path(path)) as f:
+            self.meta = json.load(f)
+        # stores written before data files were versioned keep the levels at `path` itself
+        data_file = self.meta.get('data_file')
+        data_path = os.path.join(os.path.dirname(path), data_file) if data_file else path
+        self.records = np.load(data_path, mmap_mode='r')
+        if len(self.records) != self.meta['days'] or (len(self.records) and str(self.records['Date'][0]) != self.meta['first_date']):
+            raise ValueError(f"{data_path} doesn't match its metadata.")
+        self.levels = self.records['Lake_Level']
+        self.key = (self.meta['model_fingerprint'], self.meta['data_fingerprint'], self.meta['horizon'])
+
+def _store_meta_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def load_forecast_store_meta(path):
+    try:
+        with open(_store_meta_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_forecast_store(path):
+    if not os.path.exists(_store_meta_path(path)):
+        return None
+    try:
+        return ForecastStore(path)
+    except Exception as e:
+        print(f"Error loading forecast store: {e}")
+        return None
+
+def write_forecast_store(path, training_data, days, horizon=120):
+    """
+    Forecast `days` days past the last training date and write the dates and
+    levels as a structured .npy file next to `path`, named with a new
+    version, then the model and data fingerprints and the name of that file
+    to the .json metadata. Replacing the metadata is the single step that
+    switches readers to the new store.
+    """
+    resources = _resources_for(training_data)
+    levels = _extend_levels(resources, training_data, np.empty(0), days, horizon)
+    max_date_train = training_data.max_date
+    records = np.empty(days, dtype=[('Date', 'datetime64[D]'), ('Lake_Level', 'float64')])
+    records['Date'] = pd.date_range(start=max_date_train + pd.Timedelta(days=1), periods=days, freq='D').to_numpy()
+    records['Lake_Level'] = levels
+    meta = {
+        "model_fingerprint": resources.model_fingerprint,
+        "data_fingerprint": training_data.fingerprint,
+        "horizon": horizon,
+        "first_date": str(records['Date'][0]),
+        "days": days,
+    }
+    stem = os.path.splitext(path)[0]
+    data_path = f"{stem}.{time.time_ns():x}.npy"
+    meta["data_file"] = os.path.basename(data_path)
+    previous = load_forecast_store_meta(path)
+    # write next to the target and rename, workers that already mapped the old file keep it
+    tmp_path = data_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, data_path)
+    tmp_path = _store_meta_path(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, _store_meta_path(path))
+    # older versions go, except the previous one a worker may have just read the metadata of
+    keep = {meta["data_file"], (previous or {}).get("data_file")}
+    directory = os.path.dirname(path) or '.'
+    prefix = os.path.basename(stem) + '.'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith('.npy') and name not in keep and name[len(prefix):-len('.npy')].isalnum():
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return meta
+
+class ForecastResources:
+    """
+    Everything a forecast reads: the ensemble, its fingerprint, the training
+    snapshot (None if the workbook failed to load) and the precomputed store,
+    plus how long each took to load, in seconds.
+    """
+    def __init__(self, model_output, model_fingerprint, training_data, forecast_store=None, load_timings=None):
+        self.model_output = model_output
+        self.model_fingerprint = model_fingerprint
+        check_feature_names(model_output['models'], model_output['features'])
+        self.predictors = [array_predictor(model) for model in model_output['models']]
+        self.training_data = training_data
+        self.forecast_store = forecast_store
+        self.load_timings = load_timings or {}
+        # mtimes and sizes of the source files when they were read, see reload_resources()
+        self.source_signature = None
+
+def _source_signature():
+    signature = []
+    # the store's metadata is replaced last when it is rewritten
+    for path in (model_path, excel_path, _store_meta_path(forecast_store_path), reload_trigger_path):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+def load_resources():
+    source_signature = _source_signature()
+    load_timings = {}
+    started = time.perf_counter()
+    with stage('load.model'):
+        with open(model_path, 'rb') as f:
+            model_bytes = f.read()
+        model_output = pickle.loads(model_bytes)
+        model_fingerprint = hashlib.sha256(model_bytes).hexdigest()
+    load_timings['model_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    try:
+        with stage('load.training_data'):
+            training_data = TrainingSnapshot(load_training_data())
+    except Exception as e:
+        training_data = None
+        print(f"Error loading training data: {e}")
+    load_timings['training_data_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    forecast_store = load_forecast_store(forecast_store_path)
+    load_timings['forecast_store_s'] = time.perf_counter() - started
+    resources = ForecastResources(model_output, model_fingerprint, training_data, forecast_store, load_timings)
+    resources.source_signature = source_signature
+    if training_data is not None:
+        # lets forecast() find the model this snapshot was loaded with, see _resources_for()
+        training_data.resources = resources
+    return resources
+
+_resources = None
+_resources_lock = threading.Lock()
+
+def get_resources():
+    """
+    Load the model, training data and forecast store on first use. Importing
+    this module stays cheap, so management commands and workers that never
+    forecast don't pay for unpickling the ensemble or parsing the workbook.
+    """
+    global _resources
+    if _resources is None:
+        with _resources_lock:
+            if _resources is None:
+                _resources = load_resources()
+    return _resources
+
+def get_training_data():
+    return get_resources().training_data
+
+def _resources_for(training_data):
+    # the resources `training_data` was loaded with, so that a request which started before a
+    # reload finishes on the old model; frames not from load_resources() use the current ones
+    resources = getattr(training_data, 'resources', None)
+    return resources if resources is not None else get_resources()
+
+def _smoke_forecast(resources, horizon=120):
+    training_data = resources.training_data
+    if training_data is None:
+        raise ValueError("Training data is not loaded.")
+    levels = _extend_levels(resources, training_data, np.empty(0), horizon, horizon)
+    if not np.all(np.isfinite(levels)):
+        raise ValueError("Smoke forecast produced non-finite levels.")
+
+_reload_lock = threading.Lock()
+
+def reload_resources(force=False):
+    """
+    Load the model, training data and forecast store again if any of their
+    files (or the reload trigger file) changed, or always with `force`.
+    The new resources are checked with a smoke forecast and only then swapped
+    in, in one assignment; until then, and if the check fails, requests keep
+    being served by the old ones. Requests already running finish on the
+    resources they started with. Cached trajectories of other model or data
+    versions are dropped. Returns True if new resources were swapped in.
+    """
+    global _resources
+    with _reload_lock:
+        current = _resources
+        if current is None:
+            # nothing loaded yet, this is a first load rather than a reload
+            get_resources()
+            return False
+        if not force and current.source_signature == _source_signature():
+            return False
+        try:
+            resources = load_resources()
+            _smoke_forecast(resources)
+        except Exception as e:
+            print(f"Reload failed, keeping the current model: {e}")
+            return False
+        with _resources_lock:
+            _resources = resources
+        _readiness_after_reload()
+        trajectory_cache.invalidate((resources.model_fingerprint, resources.training_data.fingerprint))
+        get_feature_store.cache_clear()
+        print(f"Reloaded model {resources.model_fingerprint[:12]} and training data {resources.training_data.fingerprint[:12]}")
+        return True
+
+def _reload_in_background(force=False):
+    threading.Thread(target=reload_resources, args=(force,), name='reload', daemon=True).start()
+
+def install_reload_signal(signal_name='SIGUSR2'):
+    """
+    Reload (forced) in a background thread when the process receives
+    `signal_name`. Only possible from the main thread.
+    """
+    if threading.current_thread() is not threading.main_thread() or not hasattr(signal, signal_name):
+        return False
+    signal.signal(getattr(signal, signal_name), lambda signum, frame: _reload_in_background(force=True))
+    return True
+
+_reload_watcher = None
+
+def start_reload_watcher(interval):
+    """Check the source files for changes every `interval` seconds and reload when they change."""
+    global _reload_watcher
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            if _resources is not None:
+                reload_resources()
+
+    with _reload_lock:
+        if _reload_watcher is None:
+            _reload_watcher = threading.Thread(target=watch, name='reload-watcher', daemon=True)
+            _reload_watcher.start()
+
+# warm-up progress: cold -> warming -> ready (or failed, then warming again after a backoff), reported by ReadinessView
+_readiness = {"status": "cold", "started": None, "finished": None, "timings": {}, "error": None, "attempts": 0, "retry_at": None}
+_readiness_lock = threading.Lock()
+
+def _warm_up_backoff(attempts):
+    # seconds before another warm-up after `attempts` failed ones, doubling up to a ceiling
+    base = getattr(settings, 'FORECAST_WARM_UP_RETRY_BACKOFF', 5)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'FORECAST_WARM_UP_RETRY_MAX_BACKOFF', 300))
+
+def readiness():
+    with _readiness_lock:
+        return dict(_readiness, timings=dict(_readiness['timings']))
+
+def _set_readiness(**state):
+    with _readiness_lock:
+        _readiness.update(state)
+
+def _readiness_after_reload():
+    # resources that passed the reload smoke forecast replace the ones a warm-up failed on
+    with _readiness_lock:
+        if _readiness['status'] == "failed":
+            _readiness.update(status="ready", finished=time.time(), error=None, attempts=0, retry_at=None)
+
+def warm_up(horizon=120):
+    """
+    Load everything, then run a representative forecast (the last month of
+    history and one block of future) and render its plot, so the first real
+    request doesn't pay for booster initialisation, the workbook, the feature
+    store or matplotlib's font cache. One block is also predicted explicitly,
+    in case the precomputed store answers the forecast. After a failure the
+    files are reloaded first if they changed. Returns the resources, or None
+    if warm-up failed.
+    """
+    from tools.views.levels_view import generate_plot
+
+    _set_readiness(status="warming", started=time.time(), finished=None, timings={}, error=None)
+    timings = {}
+    try:
+        started = time.perf_counter()
+        reload_resources()
+        resources = get_resources()
+        timings['load_s'] = time.perf_counter() - started
+        training_data = resources.training_data
+        if training_data is None:
+            raise ValueError("Training data is not loaded.")
+
+        started = time.perf_counter()
+        _extend_levels(resources, training_data, np.empty(0), horizon, horizon)
+        start_date = training_data.max_date - pd.Timedelta(days=30)
+        end_date = training_data.max_date + pd.Timedelta(days=horizon)
+        start = {"year": start_date.year, "month": start_date.month, "day": start_date.day}
+        end = {"year": end_date.year, "month": end_date.month, "day": end_date.day}
+        results = forecast(start, end, training_data, horizon)
+        timings['forecast_s'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        df = pd.DataFrame(results).set_index('Date').rename(columns={'Lake_Level': 'water_levels'})
+        if generate_plot(df, 'water_levels') is None:
+            raise RuntimeError("Could not render the warm-up plot.")
+        timings['plot_s'] = time.perf_counter() - started
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        finished = time.time()
+        with _readiness_lock:
+            attempts = _readiness['attempts'] + 1
+            _readiness.update(status="failed", finished=finished, timings=timings, error=str(e),
+                              attempts=attempts, retry_at=finished + _warm_up_backoff(attempts))
+        return None
+    _set_readiness(status="ready", finished=time.time(), timings=timings, attempts=0, retry_at=None)
+    return resources
+
+def start_warm_up():
+    """
+    Run warm_up() in a background thread, once per process unless it fails:
+    a failed warm-up is started again by the first call after its backoff
+    (FORECAST_WARM_UP_RETRY_BACKOFF seconds, doubling per failure up to
+    FORECAST_WARM_UP_RETRY_MAX_BACKOFF).
+    """
+    with _readiness_lock:
+        status = _readiness['status']
+        if status != "cold" and not (status == "failed" and time.time() >= _readiness['retry_at']):
+            return False
+        _readiness['status'] = "warming"
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    return True
+
+def _iter_extend_levels(resources, training_data, done, days, horizon):
+    # continue the trajectory `done` (starting the day after the last training date) up to `days` days, block by block
+    model_output = resources.model_output
+    features = list(model_output['features'])
+    max_date_train = training_data.max_date
+    first_day = max_date_train + pd.Timedelta(days=1 + len(done))
+    store = get_feature_store(tuple(features), training_data.min_date, max_date_train)
+    with stage('forecast.features'):
+        X = store.rows(first_day, max_date_train + pd.Timedelta(days=days))
+    seed = training_data.lag_seed(horizon, done)
+    return _iter_recursive_forecast(X, seed, resources.predictors, model_output['weights'], features, horizon)
+
+def _extend_levels(resources, training_data, done, days, horizon):
+    return np.concatenate([done, *_iter_extend_levels(resources, training_data, done, days, horizon)])
+
+_inference_slots = None
+_inference_slots_lock = threading.Lock()
+
+def _inference_semaphore():
+    # caps the number of trajectories computed at once, FORECAST_MAX_CONCURRENCY in settings
+    global _inference_slots
+    with _inference_slots_lock:
+        if _inference_slots is None:
+            limit = getattr(settings, 'FORECAST_MAX_CONCURRENCY', None) or os.cpu_count() or 1
+            _inference_slots = threading.BoundedSemaphore(limit)
+        return _inference_slots
+
+def _future_levels(resources, training_data, days, horizon):
+    """
+    Forecast Lake_Level for the first `days` days after the last training
+    date. Served from the precomputed store when it covers the range,
+    otherwise from the cached trajectory for this model and data, which is
+    extended (starting from the store if there is one) as needed.
+
+    The model and training snapshot are only read, every request works on its
+    own feature matrix and level arrays. Concurrent requests for the same
+    trajectory are coalesced: the first one computes it while the others wait
+    on the key lock and are then answered from the cache.
+    """
+    key = (resources.model_fingerprint, training_data.fingerprint, horizon)
+    forecast_store = resources.forecast_store
+    precomputed = forecast_store is not None and forecast_store.key == key
+    if precomputed and len(forecast_store.levels) >= days:
+        return forecast_store.levels[:days]
+    cached = trajectory_cache.get(key)
+    if cached is not None and len(cached) >= days:
+        trajectory_cache.count(hit=True)
+        return cached[:days]
+    with trajectory_cache.key_lock(key):
+        # an identical request may have filled the cache while we waited
+        cached = trajectory_cache.get(key)
+        if cached is not None and len(cached) >= days:
+            trajectory_cache.count(hit=True)
+            return cached[:days]
+        trajectory_cache.count(hit=False)
+        if cached is None:
+            cached = np.asarray(forecast_store.levels) if precomputed else np.empty(0)
+        with _inference_semaphore():
+            levels = _extend_levels(resources, training_data, cached, days, horizon)
+        trajectory_cache.put(key, levels)
+    return levels
+
+def _iter_future_levels(resources, training_data, days, horizon):
+    """
+    Same levels as _future_levels(), yielded in blocks of `horizon` days: what
+    the store or cache already holds first, then every newly computed block as
+    soon as it is predicted. Streaming requests are not coalesced, the
+    inference slot is only held while a block is being computed.
+    """
+    key = (resources.model_fingerprint, training_data.fingerprint, horizon)
+    forecast_store = resources.forecast_store
+    known = trajectory_cache.get(key)
+    if forecast_store is not None and forecast_store.key == key:
+        if known is None or len(forecast_store.levels) > len(known):
+            known = forecast_store.levels
+    if known is None:
+        known = np.empty(0)
+    trajectory_cache.count(hit=len(known) >= days)
+    for block_start in range(0, min(len(known), days), horizon):
+        yield known[block_start:min(block_start + horizon, days)]
+    if len(known) >= days:
+        return
+    blocks = [np.asarray(known)]
+    remaining = _iter_extend_levels(resources, training_data, blocks[0], days, horizon)
+    while True:
+        with _inference_semaphore():
+            block = next(remaining, None)
+        if block is None:
+            break
+        blocks.append(block)
+        yield block
+    trajectory_cache.put(key, np.concatenate(blocks))
+
+def _forecast_range(start, end, training_data):
     if training_data is None:
         raise ValueError("Training data is not loaded.")
     start_date = pd.Timestamp(year=start['year'], month=start['month'], day=start['day'])
     end_date = pd.Timestamp(year=end['year'], month=end['month'], day=end['day'])
     assert end_date > start_date, "End Date should be greater than Start Date"
+    if not isinstance(training_data, TrainingSnapshot):
+        training_data = TrainingSnapshot(training_data)
+    return start_date, end_date, training_data
+
+def _future_records(first_day, levels):
+    dates = pd.date_range(start=first_day, periods=len(levels), freq='D')
+    return [{'Date': date, 'Lake_Level': level} for date, level in zip(dates, levels.tolist())]
+
+def _range_records(training_data, start_date, end_date, future):
+    # rows for start_date..end_date from the history and `future`, a trajectory starting the day after it
+    max_date_train = training_data.max_date
+    results = training_data.records(start_date, min(end_date, max_date_train))
+    if end_date > max_date_train:
+        offset = max((start_date - max_date_train).days - 1, 0)
+        days = (end_date - max_date_train).days
+        results.extend(_future_records(max_date_train + pd.Timedelta(days=1 + offset), future[offset:days]))
+    return results
+
+def forecast(start, end, training_data, horizon=120):
+    start_date, end_date, training_data = _forecast_range(start, end, training_data)
+    max_date_train = training_data.max_date
+    future = None
+    if end_date > max_date_train:
+        future = _future_levels(_resources_for(training_data), training_data, (end_date - max_date_train).days, horizon)
+    with stage('forecast.records'):
+        return _range_records(training_data, start_date, end_date, future)
+
+def forecast_batch(ranges, training_data, horizon=120):
+    """
+    forecast() for a list of (start, end) pairs. The future trajectory is
+    computed once, up to the latest end date, and every range is sliced out
+    of it.
+    """
+    if training_data is not None and not isinstance(training_data, TrainingSnapshot):
+        training_data = TrainingSnapshot(training_data)
+    parsed = [_forecast_range(start, end, training_data)[:2] for start, end in ranges]
+    if not parsed:
+        return []
+    max_date_train = training_data.max_date
+    latest = max(end_date for _, end_date in parsed)
+    future = None
+    if latest > max_date_train:
+        future = _future_levels(_resources_for(training_data), training_data, (latest - max_date_train).days, horizon)
+    return [_range_records(training_data, start_date, end_date, future) for start_date, end_date in parsed]
+
+FORECAST_RECORD_DTYPE = [('Date', 'datetime64[D]'), ('Lake_Level', 'float64')]
+
+def forecast_arrays(start, end, training_data, horizon=120):
+    """
+    Date and Lake_Level columns of forecast(start, end) as a structured numpy
+    array, built from the history and trajectory arrays without going
+    through per-row dicts.
+    """
+    start_date, end_date, training_data = _forecast_range(start, end, training_data)
+    max_date_train = training_data.max_date
+    lo, hi = training_data.bounds(start_date, min(end_date, max_date_train))
+    levels = [training_data.levels[lo:hi]]
+    dates = [training_data.dates[lo:hi].astype('datetime64[D]')]
+    if end_date > max_date_train:
+        future = _future_levels(_resources_for(training_data), training_data, (end_date - max_date_train).days, horizon)
+        offset = max((start_date - max_date_train).days - 1, 0)
+        first_day = (max_date_train + pd.Timedelta(days=1 + offset)).to_datetime64().astype('datetime64[D]')
+        levels.append(future[offset:])
+        dates.append(first_day + np.arange(len(future) - offset))
+    records = np.empty(sum(len(l) for l in levels), dtype=FORECAST_RECORD_DTYPE)
+    records['Date'] = np.concatenate(dates)
+    records['Lake_Level'] = np.concatenate(levels)
+    return records
+
+def iter_forecast(start, end, training_data, horizon=120, chunk_size=1000):
+    """
+    The rows of forecast(start, end), yielded in lists as they become
+    available: the history slice in chunks of `chunk_size` rows, then the
+    future trajectory one block at a time. The range is validated before
+    anything is yielded.
+    """
+    start_date, end_date, training_data = _forecast_range(start, end, training_data)
+    resources = _resources_for(training_data) if end_date > training_data.max_date else None
 
-    training_data = training_data.sort_values('Date')
-    max_date_train = training_data['Date'].max()
-    if end_date <= max_date_train:
-        sample = training_data[(training_data['Date'] >= start_date) & (training_data['Date'] <= end_date)]
-        return sample.to_dict(orient="records")
-
-    models = model_output['models']
-    weights = model_output['weights']
-    features = model_output['features']
-    if start_date < max_date_train:
-        results = []
-        sample = training_data[(training_data['Date'] >= start_date) & (training_data['Date'] <= max_date_train)]
-        results.extend(sample.to_dict(orient="records"))
-        future_timestamps = pd.date_range(start=max_date_train + pd.Timedelta(days=1), end=end_date, freq='D')
-        df_future = pd.DataFrame({'Date':future_timestamps})
-        df_future['split'] = 'future'
-        training_data['split'] = 'train'
-        combined = pd.concat([training_data, df_future])
-        combined['month'] = combined['Date'].dt.month
-        combined['dayofweek'] = combined['Date'].dt.dayofweek
-        combined['year'] = combined['Date'].dt.year
-        year_min= training_data['Date'].dt.year.min()
-        combined['years_since_min'] = combined['year'] - year_min
-        combined['day'] = combined['Date'].dt.day
-        combined['weekend'] = (combined['dayofweek'] >= 5).astype('int32')
-        combined['quarter'] = combined['Date'].dt.quarter
-        combined['week'] = combined['Date'].dt.isocalendar().week
-        combined = combined.drop(['year'], axis=1)
-        combined = pd.get_dummies(data=combined, columns=['dayofweek', 'month', 'quarter', 'week'], dtype='int32')
-        combined = combined.sort_values('Date')
-        combined['lag_Lake_Level'] = combined['Lake_Level'].shift(horizon).bfill()
-        future_dataset = combined[combined['split'] == 'future'].drop(['split'], axis=1).reset_index(drop=True)
-        model_predictions = []
-        for model in models:
-            X = future_dataset[:horizon].drop(['Date', 'Lake_Level'], axis=1)[features]
-            y_hat = np.exp(model.predict(X))
-            model_predictions.append(y_hat)
-        y_hat = np.sum(np.array(model_predictions) * weights[:, np.newaxis], axis=0)
-        future_dataset.loc[:horizon-1, 'Lake_Level'] = y_hat
-        predictions = []
-        lag_Lake_Level = y_hat[-1]
-        for _, row in future_dataset[horizon:].iterrows():
-            row['lag_Lake_Level'] = lag_Lake_Level
-            model_predictions = []
-            for model in models:
-                X = row.drop(['Date', 'Lake_Level'])[features].to_frame().T.astype('float32')
-                y_hat = np.exp(model.predict(X))
-                model_predictions.append(y_hat)
-            y_hat = np.sum(np.array(model_predictions) * weights[:, np.newaxis], axis=0)
-            lag_Lake_Level = y_hat
-            predictions.append(y_hat)
-        future_dataset.loc[horizon:, 'Lake_Level'] = predictions
-        sample = future_dataset[['Date', 'Lake_Level']]
-        results.extend(sample.to_dict(orient="records"))
-        return results
-    if start_date > max_date_train:
-        results = []
-        future_timestamps = pd.date_range(start=max_date_train + pd.Timedelta(days=1), end=end_date, freq='D')
-        df_future = pd.DataFrame({'Date':future_timestamps})
-        df_future['split'] = 'future'
-        training_data['split'] = 'train'
-        combined = pd.concat([training_data, df_future])
-        combined['month'] = combined['Date'].dt.month
-        combined['dayofweek'] = combined['Date'].dt.dayofweek
-        combined['year'] = combined['Date'].dt.year
-        year_min= training_data['Date'].dt.year.min()
-        combined['years_since_min'] = combined['year'] - year_min
-        combined['day'] = combined['Date'].dt.day
-        combined['weekend'] = (combined['dayofweek'] >= 5).astype('int32')
-        combined['quarter'] = combined['Date'].dt.quarter
-        combined['week'] = combined['Date'].dt.isocalendar().week
-        combined = combined.drop(['year'], axis=1)
-        combined = pd.get_dummies(data=combined, columns=['dayofweek', 'month', 'quarter', 'week'], dtype='int32')
-        combined = combined.sort_values('Date')
-        combined['lag_Lake_Level'] = combined['Lake_Level'].shift(horizon).bfill()
-        future_dataset = combined[combined['split'] == 'future'].drop(['split'], axis=1).reset_index(drop=True)
-        model_predictions = []
-        for model in models:
-            X = future_dataset[:horizon].drop(['Date', 'Lake_Level'], axis=1)[features]
-            y_hat = np.exp(model.predict(X))
-            model_predictions.append(y_hat)
-        y_hat = np.sum(np.array(model_predictions) * weights[:, np.newaxis], axis=0)
-        future_dataset.loc[:horizon-1, 'Lake_Level'] = y_hat
-        predictions = []
-        lag_Lake_Level = y_hat[-1]
-        for _, row in future_dataset[horizon:].iterrows():
-            row['lag_Lake_Level'] = lag_Lake_Level
-            model_predictions = []
-            for model in models:
-                X = row.drop(['Date', 'Lake_Level'])[features].to_frame().T.astype('float32')
-                y_hat = np.exp(model.predict(X))
-                model_predictions.append(y_hat)
-            y_hat = np.sum(np.array(model_predictions) * weights[:, np.newaxis], axis=0)
-            lag_Lake_Level = y_hat
-            predictions.append(y_hat)
-        future_dataset.loc[horizon:, 'Lake_Level'] = predictions
-        future_dataset = future_dataset[future_dataset['Date'] >= start_date]
-        sample = future_dataset[['Date', 'Lake_Level']]
-        results.extend(sample.to_dict(orient="records"))
-        return results
+    def chunks():
+        max_date_train = training_data.max_date
+        lo, hi = training_data.bounds(start_date, min(end_date, max_date_train))
+        for chunk_start in range(lo, hi, chunk_size):
+            yield training_data.rows(chunk_start, min(chunk_start + chunk_size, hi))
+        if resources is None:
+            return
+        offset = max((start_date - max_date_train).days - 1, 0)
+        position = 0
+        for block in _iter_future_levels(resources, training_data, (end_date - max_date_train).days, horizon):
+            skip = min(max(offset - position, 0), len(block))
+            if skip < len(block):
+                yield _future_records(max_date_train + pd.Timedelta(days=1 + position + skip), block[skip:])
+            position += len(block)
+
+    return chunks()
+
+def _json_record(record):
+    # Convert numpy types to native Python types for JSON serialization
+    record["Date"] = record["Date"].strftime("%Y-%m-%d") if hasattr(record["Date"], "strftime") else str(record["Date"])
+    if "Lake_Level" in record and hasattr(record["Lake_Level"], "item"):
+        record["Lake_Level"] = record["Lake_Level"].item()
+    return record
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON, one forecast row per line. Selected with
+    `Accept: application/x-ndjson` or `?format=ndjson`; forecasts are streamed
+    by the view, this only renders error payloads in that format.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data) + '\n').encode('utf-8')
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    `{"start": ..., "freq": "D", "Lake_Level": [...]}` instead of one object per
+    row. Selected with `Accept: application/vnd.livwa.columnar+json` or
+    `?format=columnar`.
+    """
+    media_type = 'application/vnd.livwa.columnar+json'
+    format = 'columnar'
+
+class NpyRenderer(BaseRenderer):
+    """
+    The forecast as a NumPy .npy file holding a structured (Date, Lake_Level)
+    array. Selected with `Accept: application/x-npy` or `?format=npy`.
+    """
+    media_type = 'application/x-npy'
+    format = 'npy'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, np.ndarray):
+            buf = BytesIO()
+            np.save(buf, data, allow_pickle=False)
+            return buf.getvalue()
+        # error payloads
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data).encode('utf-8')
+
+def _columnar(records):
+    columns = {"start": None, "freq": "D", "Lake_Level": records['Lake_Level'].tolist()}
+    if len(records):
+        columns["start"] = str(records['Date'][0])
+        if np.any(np.diff(records['Date']) != np.timedelta64(1, 'D')):
+            # the workbook has gaps, spell the dates out
+            columns["freq"] = None
+            columns["Date"] = records['Date'].astype(str).tolist()
+    return columns
+
+def _ndjson_lines(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(_json_record(record)) + '\n' for record in chunk).encode('utf-8')
 
 class ForecastLakeLevelsView(APIView):
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer, ColumnarJSONRenderer, NpyRenderer]
+
     def post(self, request):
         serializer = ForecastRequestSerializer(data=request.data)
         if not serializer.is_valid():
             return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            training_data = get_training_data()
+        except Exception as e:
+            return Response({"error": f"Model not loaded: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         if training_data is None:
             return Response({"error": "Training data not loaded."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         validated_data = serializer.validated_data
         required_keys = ['start_year', 'start_month', 'start_day', 'end_year', 'end_month', 'end_day']
         if not isinstance(validated_data, dict) or not all(k in validated_data for k in required_keys):
             return Response({"error": "Invalid or empty input data."}, status=status.HTTP_400_BAD_REQUEST)
-        start = {
-            "year": validated_data['start_year'],
-            "month": validated_data['start_month'],
-            "day": validated_data['start_day']
-        }
-        end = {
-            "year": validated_data['end_year'],
-            "month": validated_data['end_month'],
-            "day": validated_data['end_day']
-        }
+        start = _date_parts(validated_data, 'start')
+        end = _date_parts(validated_data, 'end')
         try:
+            if request.accepted_renderer.format == NDJSONRenderer.format:
+                # rows go out as the history slices and forecast blocks become available
+                chunks = iter_forecast(start, end, training_data)
+                return StreamingHttpResponse(_ndjson_lines(chunks), content_type=NDJSONRenderer.media_type)
+            if request.accepted_renderer.format == NpyRenderer.format:
+                return Response(forecast_arrays(start, end, training_data), status=status.HTTP_200_OK)
+            if request.accepted_renderer.format == ColumnarJSONRenderer.format:
+                return Response(_columnar(forecast_arrays(start, end, training_data)), status=status.HTTP_200_OK)
             results = forecast(start, end, training_data)
             if results is None:
                 return Response({"error": "No forecast results returned."}, status=status.HTTP_404_NOT_FOUND)
-            # Convert numpy types to native Python types for JSON serialization
-            for r in results:
-                r["Date"] = r["Date"].strftime("%Y-%m-%d") if hasattr(r["Date"], "strftime") else str(r["Date"])
-                if "Lake_Level" in r and hasattr(r["Lake_Level"], "item"):
-                    r["Lake_Level"] = r["Lake_Level"].item()
+            with stage('forecast.serialize'):
+                for r in results:
+                    _json_record(r)
             return Response({"forecast": results}, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class ForecastBatchView(APIView):
+    """
+    Several forecast ranges in one call, e.g.
+    {"ranges": [{"start_year": 2025, ..., "end_day": 1}, ...]}. The ensemble
+    runs once up to the latest end date and each range is sliced from it.
+    """
+    def post(self, request):
+        serializer = ForecastBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            training_data = get_training_data()
+        except Exception as e:
+            return Response({"error": f"Model not loaded: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if training_data is None:
+            return Response({"error": "Training data not loaded."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        ranges = [(_date_parts(r, 'start'), _date_parts(r, 'end')) for r in serializer.validated_data['ranges']]
+        try:
+            batch = forecast_batch(ranges, training_data)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        forecasts = []
+        for (start, end), results in zip(ranges, batch):
+            forecasts.append({
+                "start": "{year:04d}-{month:02d}-{day:02d}".format(**start),
+                "end": "{year:04d}-{month:02d}-{day:02d}".format(**end),
+                "forecast": [_json_record(r) for r in results],
+            })
+        return Response({"forecasts": forecasts}, status=status.HTTP_200_OK)
+
 class HealthCheckView(APIView):
+    """
+    Liveness and diagnostics. Never loads anything itself: before the first
+    load it reports "starting", and "degraded" (503) when the training data
+    or the warm-up failed, even if nothing could be loaded.
+    """
+    def get(self, request):
+        resources = _resources
+        warm_up_state = readiness()
+        payload = {
+            "status": "healthy",
+            "model": "lake_level_forecast_v1",
+            "model_fingerprint": None,
+            "training_data_fingerprint": None,
+            "ready": warm_up_state['status'] == "ready",
+            "warm_up": warm_up_state,
+            "load_timings": {},
+            "caches": {
+                "trajectory": trajectory_cache.stats(),
+                "feature_store": get_feature_store.cache_info()._asdict(),
+                "forecast_store": None,
+            },
+        }
+        if resources is None:
+            if warm_up_state['status'] == "failed":
+                payload["status"] = "degraded"
+                return Response(payload, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            payload["status"] = "starting"
+            return Response(payload, status=status.HTTP_200_OK)
+        training_data = resources.training_data
+        payload["model_fingerprint"] = resources.model_fingerprint
+        payload["load_timings"] = resources.load_timings
+        if training_data is not None:
+            payload["training_data_fingerprint"] = training_data.fingerprint
+        forecast_store = resources.forecast_store
+        if forecast_store is not None:
+            payload["caches"]["forecast_store"] = {
+                "days": len(forecast_store.levels),
+                "current": training_data is not None and forecast_store.key[:2] == (resources.model_fingerprint, training_data.fingerprint),
+            }
+        if training_data is None or warm_up_state['status'] == "failed":
+            payload["status"] = "degraded"
+            return Response(payload, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(payload, status=status.HTTP_200_OK)
+
+class ReadinessView(APIView):
+    """
+    503 until warm_up() has finished, 200 afterwards; for load balancers to
+    only route to warm workers. The first probe starts the warm-up if the
+    worker hasn't already (see FORECAST_WARM_UP_ON_START).
+    """
+    def get(self, request):
+        start_warm_up()
+        state = readiness()
+        if state['status'] == "ready":
+            return Response(state, status=status.HTTP_200_OK)
+        return Response(state, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+class MetricsView(APIView):
+    """
+    Stage latency histograms in the Prometheus text format, empty unless
+    INSTRUMENTATION_ENABLED is set.
+    """
     def get(self, request):
-        return Response({"status": "healthy", "model": "lake_level_forecast_v1"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
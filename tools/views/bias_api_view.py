@@ -0,0 +1,173 @@
+# Bias correction through the API, for scripted pipelines. Takes the same
+# methods as the bias() form, with the series either as JSON columns or as
+# uploaded .csv/.xlsx/.npy files, and answers with the corrected values and
+# the skill scores as columnar JSON, the corrected values as a .npy
+# structured array, or both as a .npz. The plot is only drawn when asked for.
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from tools.instrumentation import stage
+from tools.skill_metrics import bootstrap_intervals
+from tools.upload_cache import cached_upload, upload_digest
+from tools.uploads import frame_from_columns, read_upload
+from tools.views import bias_view
+from tools.views.api_code import NpyRenderer
+
+
+def max_bootstrap_draws():
+    # bootstrap resamples times aligned rows a request may ask for
+    return getattr(settings, 'BIAS_BOOTSTRAP_MAX_DRAWS', 20_000_000)
+
+class NpzRenderer(NpyRenderer):
+    """
+    Named arrays as a NumPy .npz file. Selected with
+    `Accept: application/x-npz` or `?format=npz`.
+    """
+    media_type = 'application/x-npz'
+    format = 'npz'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and data and all(isinstance(v, np.ndarray) for v in data.values()):
+            buf = BytesIO()
+            np.savez(buf, **data)
+            return buf.getvalue()
+        return super().render(data, accepted_media_type, renderer_context)
+
+class BiasCorrectionRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=list(bias_view.BIAS_METHODS) + [bias_view.COMPARE_ALL])
+    # the series come as "observed" / "remote" columns, {"Date": [...], "<column>": [...]}, read
+    # straight from the request data (a JSONField would re-encode them to validate), or as files
+    observations_file = serializers.FileField(required=False)
+    remote_sensing_file = serializers.FileField(required=False)
+    plot = serializers.BooleanField(required=False, default=False)
+    # bootstrap resamples for confidence intervals of the scores, 0 for none; resamples times
+    # rows are also limited by max_bootstrap_draws()
+    bootstrap = serializers.IntegerField(required=False, default=0, min_value=0, max_value=10000)
+    confidence = serializers.FloatField(required=False, default=0.95, min_value=0.5, max_value=0.999)
+
+    def validate(self, data):
+        for series, file in (('observed', 'observations_file'), ('remote', 'remote_sensing_file')):
+            if (series in self.initial_data) == (file in data):
+                raise serializers.ValidationError(f"Send exactly one of '{series}' and '{file}'.")
+        return data
+
+def _series(request_data, data, series, file):
+    if series in request_data:
+        return frame_from_columns(request_data[series])
+    upload = data[file]
+    return cached_upload(upload, upload_digest(upload), read_upload)
+
+def _json_floats(values):
+    # strict JSON has no NaN, missing values go out as null
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), None, values).tolist()
+
+def _json_scores(frame):
+    return {metric: _json_floats(frame[metric]) for metric in frame.columns}
+
+def _score_records(frame):
+    # (column, <metric>...) rows of calculate_column_metrics()
+    columns = [str(c) for c in frame.index]
+    records = np.empty(len(frame), dtype=[('column', f'U{max(map(len, columns), default=1)}')] + [(m, 'f8') for m in frame.columns])
+    records['column'] = columns
+    for metric in frame.columns:
+        records[metric] = frame[metric].to_numpy(dtype=float)
+    return records
+
+def _records(corrected):
+    records = np.empty(len(corrected), dtype=[('Date', 'datetime64[D]')] + [(str(c), 'f8') for c in corrected.columns])
+    records['Date'] = corrected.index.to_numpy().astype('datetime64[D]')
+    for column in corrected.columns:
+        records[str(column)] = corrected[column].to_numpy(dtype=float)
+    return records
+
+class BiasCorrectionView(APIView):
+    """
+    POST a method (any of the bias() form's, or "compare_all") and both
+    series, e.g.
+    {"method": "quantile_mapping",
+     "observed": {"Date": ["2020-01-01", ...], "station_1": [...]},
+     "remote": {"Date": [...], "station_1": [...]}}
+    or multipart with observations_file / remote_sensing_file. Optional:
+    "plot" (base64 PNG, off by default), "bootstrap" resamples and
+    "confidence" for score intervals; resamples times aligned rows may not
+    exceed BIAS_BOOTSTRAP_MAX_DRAWS. `?format=npy` returns the corrected
+    values as a structured (Date, <columns>) array, `?format=npz` the same
+    as "corrected" with the scores as (column, <metric>...) arrays "before"
+    and "after".
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NpyRenderer, NpzRenderer]
+
+    def post(self, request):
+        serializer = BiasCorrectionRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        method = data['method']
+        try:
+            with stage('bias.parse'):
+                observed = _series(request.data, data, 'observed', 'observations_file')
+                remote = _series(request.data, data, 'remote', 'remote_sensing_file')
+            ranking = None
+            with stage('bias.correct'):
+                if method == bias_view.COMPARE_ALL:
+                    corrected_by_method, errors = bias_view.compare_all(observed, remote)
+                    ranking = bias_view.rank_methods(observed, corrected_by_method, errors)
+                    corrected_by_method = {row['method']: corrected_by_method[row['method']] for row in ranking if row['error'] is None}
+                    corrected = corrected_by_method[ranking[0]['method']]
+                else:
+                    corrected = bias_view.BIAS_METHODS[method][1](bias_view.CorrectionInputs(observed, remote))
+            with stage('bias.metrics'):
+                before = bias_view.calculate_column_metrics(observed, remote)
+                after = bias_view.calculate_column_metrics(observed, corrected)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if request.accepted_renderer.format == NpyRenderer.format:
+            return Response(_records(corrected), status=status.HTTP_200_OK)
+        if request.accepted_renderer.format == NpzRenderer.format:
+            arrays = {"corrected": _records(corrected), "before": _score_records(before), "after": _score_records(after)}
+            return Response(arrays, status=status.HTTP_200_OK)
+
+        with stage('bias.serialize'):
+            payload = {
+                "method": ranking[0]['method'] if ranking else method,
+                "columns": [str(c) for c in corrected.columns],
+                "Date": corrected.index.strftime('%Y-%m-%d').tolist(),
+                "corrected": {str(c): _json_floats(corrected[c]) for c in corrected.columns},
+                # one value per column for every score
+                "metrics": {"before": _json_scores(before), "after": _json_scores(after)},
+            }
+            if ranking:
+                payload["ranking"] = [
+                    {key: (None if isinstance(value, float) and value != value else value) for key, value in row.items()}
+                    for row in ranking
+                ]
+        if data['bootstrap']:
+            _, obs, mod = bias_view.aligned_values(observed, corrected)
+            if data['bootstrap'] * len(obs) > max_bootstrap_draws():
+                return Response(
+                    {"error": f"bootstrap x {len(obs)} rows is over the limit of {max_bootstrap_draws()} draws, ask for fewer resamples."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            with stage('bias.bootstrap'):
+                intervals = bootstrap_intervals(obs, mod, samples=data['bootstrap'], confidence=data['confidence'])
+            payload["intervals"] = {
+                metric: {"low": _json_floats(low), "high": _json_floats(high)} for metric, (low, high) in intervals.items()
+            }
+        if data['plot']:
+            if ranking:
+                payload["plot_base64"] = bias_view.generate_comparison_plot(observed, corrected_by_method, remote)
+            else:
+                payload["plot_base64"] = bias_view.generate_plot(observed, corrected, remote)
+        return Response(payload, status=status.HTTP_200_OK)
@@ -0,0 +1,130 @@
+# Fitted bias correction models (tools.models.BiasModel) through the API:
+# fit a method once on reference observed and remote sensing uploads, then
+# correct every new remote sensing delivery with the stored parameters.
+# Models belong to the authenticated user and are grouped by project.
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from tools.bias_models import FITTABLE_METHODS, fit_bias_model
+from tools.instrumentation import stage
+from tools.models import BiasModel
+from tools.upload_cache import cached_upload, upload_digest
+from tools.uploads import read_upload
+
+
+class BiasModelFitSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    project = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    method = serializers.ChoiceField(choices=FITTABLE_METHODS)
+    monthly = serializers.BooleanField(required=False, default=False)
+    quantiles = serializers.IntegerField(required=False, min_value=2, max_value=10001)
+    observations_file = serializers.FileField()
+    remote_sensing_file = serializers.FileField()
+
+class BiasModelApplySerializer(serializers.Serializer):
+    remote_sensing_file = serializers.FileField()
+
+def _read(file):
+    with stage('bias.parse'):
+        return cached_upload(file, upload_digest(file), read_upload)
+
+def _summary(model, parameters=False):
+    summary = {
+        "id": model.id,
+        "name": model.name,
+        "project": model.project,
+        "method": model.method,
+        "monthly": model.monthly,
+        "quantiles": model.quantiles,
+        "columns": model.columns,
+        "reference_start": model.reference_start,
+        "reference_end": model.reference_end,
+        "created": model.created,
+        "updated": model.updated,
+        "url": reverse('bias-model', args=[model.id]),
+        "apply_url": reverse('bias-model-apply', args=[model.id]),
+    }
+    if parameters:
+        summary["parameters"] = model.parameters
+    return summary
+
+class BiasModelListView(APIView):
+    """
+    GET lists the user's fitted models (`?project=` to filter). POST fits
+    one from multipart uploads, e.g. name, method, monthly, quantiles,
+    observations_file, remote_sensing_file; a model with the same project
+    and name is refitted.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        models = BiasModel.objects.filter(owner=request.user)
+        if 'project' in request.query_params:
+            models = models.filter(project=request.query_params['project'])
+        return Response({"models": [_summary(m) for m in models]}, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = BiasModelFitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        try:
+            observed = _read(data['observations_file'])
+            modeled = _read(data['remote_sensing_file'])
+            with stage('bias.fit'):
+                fitted = fit_bias_model(data['method'], observed, modeled, monthly=data['monthly'], quantiles=data.get('quantiles'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        model, created = BiasModel.objects.update_or_create(
+            owner=request.user, project=data['project'], name=data['name'],
+            defaults=dict(
+                fitted,
+                reference_start=observed.index.min().date() if len(observed) else None,
+                reference_end=observed.index.max().date() if len(observed) else None,
+            ),
+        )
+        return Response(_summary(model, parameters=True), status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class BiasModelView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, model_id):
+        model = BiasModel.objects.filter(owner=request.user, id=model_id).first()
+        if model is None:
+            return Response({"error": "Unknown bias model."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(_summary(model, parameters=True), status=status.HTTP_200_OK)
+
+    def delete(self, request, model_id):
+        deleted, _ = BiasModel.objects.filter(owner=request.user, id=model_id).delete()
+        if not deleted:
+            return Response({"error": "Unknown bias model."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class BiasModelApplyView(APIView):
+    """
+    Correct an uploaded remote_sensing_file with a fitted model, answered
+    column by column: {"model": id, "Date": [...], "<column>": [...]}.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, model_id):
+        model = BiasModel.objects.filter(owner=request.user, id=model_id).first()
+        if model is None:
+            return Response({"error": "Unknown bias model."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = BiasModelApplySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            modeled = _read(serializer.validated_data['remote_sensing_file'])
+            with stage('bias.apply'):
+                corrected = model.apply(modeled)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        payload = {"model": model.id, "Date": corrected.index.strftime('%Y-%m-%d').tolist()}
+        for column in corrected.columns:
+            values = corrected[column].to_numpy(dtype=float)
+            payload[column] = [None if v != v else v for v in values.tolist()]
+        return Response(payload, status=status.HTTP_200_OK)
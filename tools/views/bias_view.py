@@ -1,71 +1,123 @@
 import pandas as pd, numpy as np
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from django.shortcuts import render
 from django.contrib import messages
 import base64
 from io import BytesIO
 import matplotlib.pyplot as plt
+from tools.bias_corrections import interp_columns, matching_columns, sorted_percentiles
+from tools.instrumentation import stage
+from tools.skill_metrics import METRICS, skill_scores
+from tools.uploads import read_upload
+from tools.upload_cache import cached_upload, load_result, result_key, store_result, upload_digest
 
 # =================================================================================================================
 
 # __________________________________________________________________________________________________BIAS CORRECTION
+# Every method corrects all matching columns (one per station or grid cell) of the observed and remote sensing
+# frames at once, on 2-D arrays with one column per series.
+def _column_arrays(observed, modeled):
+    observed_columns, modeled_columns = matching_columns(observed, modeled)
+    return observed_columns, observed[observed_columns].to_numpy(dtype=float), modeled[modeled_columns].to_numpy(dtype=float)
+
+class CorrectionInputs:
+    """
+    The matched columns of an observed and a modeled frame as 2-D arrays,
+    plus the sorted arrays, means and standard deviations the methods use,
+    computed once on first use. Running several methods on the same
+    CorrectionInputs shares all of them.
+    """
+    def __init__(self, observed, modeled):
+        self.observed = observed
+        self.modeled = modeled
+        self.columns, self.observed_values, self.modeled_values = _column_arrays(observed, modeled)
+
+    @functools.cached_property
+    def sorted_observed(self):
+        return np.sort(self.observed_values, axis=0)
+
+    @functools.cached_property
+    def sorted_modeled(self):
+        return np.sort(self.modeled_values, axis=0)
+
+    @functools.cached_property
+    def observed_mean(self):
+        return np.nanmean(self.observed_values, axis=0)
+
+    @functools.cached_property
+    def modeled_mean(self):
+        return np.nanmean(self.modeled_values, axis=0)
+
+    @functools.cached_property
+    def observed_std(self):
+        return np.nanstd(self.observed_values, axis=0)
+
+    @functools.cached_property
+    def modeled_std(self):
+        return np.nanstd(self.modeled_values, axis=0)
+
+    def precompute(self):
+        # fill every shared value up front, e.g. before running methods in parallel
+        for name in ('sorted_observed', 'sorted_modeled', 'observed_mean', 'modeled_mean', 'observed_std', 'modeled_std'):
+            getattr(self, name)
+
+    def frame(self, corrected, index):
+        return pd.DataFrame(corrected, index=index, columns=self.columns)
+
+def _linear_scaling(inputs):
+    scale_factor = inputs.observed_mean / inputs.modeled_mean
+    return inputs.frame(inputs.modeled_values * scale_factor, inputs.modeled.index)
+
+def _quantile_mapping(inputs):
+    corrected = interp_columns(inputs.modeled_values, inputs.sorted_modeled, inputs.sorted_observed)
+    return inputs.frame(corrected, inputs.observed.index)
+
+def _delta_change(inputs):
+    change_factor = inputs.observed_values[-1] - inputs.observed_values[0]
+    return inputs.frame(inputs.modeled_values + change_factor, inputs.observed.index)
+
+def _empirical_quantile(inputs):
+    percentiles = sorted_percentiles(inputs.sorted_modeled, len(inputs.observed_values))
+    corrected = interp_columns(inputs.modeled_values, percentiles, inputs.observed_values)
+    return inputs.frame(corrected, inputs.observed.index)
+
+def _variance_scaling(inputs):
+    std_factor = inputs.observed_std / inputs.modeled_std
+    corrected = (inputs.modeled_values - inputs.modeled_mean) * std_factor + inputs.observed_mean
+    return inputs.frame(corrected, inputs.modeled.index)
+
+# form value -> (display name, correction on CorrectionInputs)
+BIAS_METHODS = {
+    "linear_scaling": ("Linear Scaling", _linear_scaling),
+    "quantile_mapping": ("Quantile Mapping", _quantile_mapping),
+    "delta_change": ("Delta Change", _delta_change),
+    "empirical_quantile": ("Empirical Quantile", _empirical_quantile),
+    "variance_scaling": ("Variance Scaling", _variance_scaling),
+}
+COMPARE_ALL = "compare_all"
+
 def linear_scaling(observed, modeled):
-    scale_factor = np.mean(observed) / np.mean(modeled)
-    corrected = modeled * scale_factor
-    return corrected
+    return _linear_scaling(CorrectionInputs(observed, modeled))
 # ================================================================================================== linear scaling
 def quantile_mapping(observed, modeled):
-    idx = observed.index
-    observed = observed.to_numpy().flatten()
-    modeled = modeled.to_numpy().flatten()
-    sorted_observed = np.sort(observed)
-    sorted_modeled = np.sort(modeled)
-    corrected = np.interp(modeled, sorted_modeled, sorted_observed)
-    corrected = pd.DataFrame(corrected, index=idx, columns=["corrected"])
-    return corrected
+    return _quantile_mapping(CorrectionInputs(observed, modeled))
 # ================================================================================================ quantile mapping
 def delta_change(observed, modeled):
-    idx = observed.index
-    observed = observed.to_numpy().flatten()
-    modeled = modeled.to_numpy().flatten()
-    change_factor = observed[-1] - observed[0]
-    corrected = modeled + change_factor
-    corrected = pd.DataFrame(corrected, index=idx, columns=["corrected"])
-    return corrected
+    return _delta_change(CorrectionInputs(observed, modeled))
 # ==================================================================================================== delta change
 def empirical_quantile(observed, modeled):
-    idx = observed.index
-    observed = observed.to_numpy().flatten()
-    modeled = modeled.to_numpy().flatten()
-    percentiles = np.percentile(modeled, np.linspace(0, 100, len(observed)))
-    corrected = np.interp(modeled, percentiles, observed)
-    corrected = pd.DataFrame(corrected, index=idx, columns=["corrected"])
-    return corrected
+    return _empirical_quantile(CorrectionInputs(observed, modeled))
 # ============================================================================================== empirical quantile
 def variance_scaling(observed, modeled):
-    mean_factor = np.mean(observed) / np.mean(modeled)
-    std_factor = np.std(observed) / np.std(modeled)
-    corrected = (modeled - np.mean(modeled)) * std_factor + np.mean(observed)
-    return corrected
+    return _variance_scaling(CorrectionInputs(observed, modeled))
 # ================================================================================================ variance scaling
 #
 #
 def kge_calculate(observed, modeled):
-    # Ensure inputs are NumPy arrays
-    modeled = np.asarray(modeled)
-    observed = np.asarray(observed)
-    # Remove NaN values
-    mask = ~np.isnan(modeled) & ~np.isnan(observed)
-    modeled = modeled[mask]
-    observed = observed[mask]
-    # Calculate correlation coefficient (r)
-    r = np.corrcoef(modeled, observed)[0, 1]
-    # Calculate standard deviation ratio (alpha)
-    alpha = np.std(modeled) / np.std(observed)
-    # Calculate mean ratio (beta)
-    beta = np.mean(modeled) / np.mean(observed)
-    # Compute KGE score
-    kge_value = 1 - np.sqrt((r - 1)**2 + (alpha - 1)**2 + (beta - 1)**2)
-    return kge_value
+    return skill_scores(observed, modeled)['KGE']
 
 def calculate_metrics(observed_data, modeled_data, reference_data=None):
     print(f"Calculating metrics for: {modeled_data.columns}") # Check columns
@@ -77,62 +129,166 @@ def calculate_metrics(observed_data, modeled_data, reference_data=None):
     common_index = observed_data.index.intersection(modeled_data.index)
     if common_index.empty:
         print("Warning: No common index found between observed and modeled data.")
-        return {'RMSE': float('nan'), 'MAE': float('nan'), 'Bias': float('nan'), 'Correlation': float('nan'), 'NSE': float('nan'), 'KGE': float('nan')}
-
-    obs = observed_data.loc[common_index, obs_col].astype(float)
-    mod = modeled_data.loc[common_index, mod_col].astype(float)
-    # Basic example calculations (replace with proper library like hydroeval or sklearn)
-    diff = mod - obs
-    rmse = (diff**2).mean()**0.5
-    mae = diff.abs().mean()
-    bias = diff.mean()
-    corr = obs.corr(mod) # Pandas correlation
-    nse = 1 - ((diff**2).sum() / ((obs - obs.mean())**2).sum())
-    kge = kge_calculate(obs, mod)
-
-    return {
-        'RMSE': rmse if pd.notna(rmse) else float('nan'),
-        'MAE': mae if pd.notna(mae) else float('nan'),
-        'Bias': bias if pd.notna(bias) else float('nan'),
-        'Correlation': corr if pd.notna(corr) else float('nan'),
-        'NSE': nse if pd.notna(nse) else float('nan'),
-        'KGE': kge if pd.notna(kge) else float('nan'),
-    }
+        return {metric: float('nan') for metric in METRICS}
+
+    obs = _values_on(observed_data, common_index, obs_col)
+    mod = _values_on(modeled_data, common_index, mod_col)
+    return skill_scores(obs, mod)
+
+def _values_on(frame, index, columns):
+    # frames already on the common dates (e.g. a correction of the other one) skip the lookup
+    if frame.index.equals(index):
+        return frame[columns].to_numpy(dtype=float)
+    return frame.loc[index, columns].to_numpy(dtype=float)
+
+def aligned_values(observed_data, modeled_data):
+    """
+    The matching columns of both frames on their common dates, as
+    (observed columns, observed array, modeled array) with one column per
+    series.
+    """
+    observed_columns, modeled_columns = matching_columns(observed_data, modeled_data)
+    common_index = observed_data.index.intersection(modeled_data.index)
+    obs = _values_on(observed_data, common_index, observed_columns)
+    mod = _values_on(modeled_data, common_index, modeled_columns)
+    return observed_columns, obs, mod
+
+def calculate_column_metrics(observed_data, modeled_data):
+    """
+    The calculate_metrics() scores for every matching column pair at once,
+    as a DataFrame with one row per observed column. Rows where either value
+    is missing are left out of that column's scores.
+    """
+    observed_columns, obs, mod = aligned_values(observed_data, modeled_data)
+    return pd.DataFrame(skill_scores(obs, mod), index=pd.Index(observed_columns, name='column'))
 
 def generate_plot(observed_data, corrected_data, remote_data):
     print("Generating plot...")
     try:
-        fig, ax = plt.subplots(figsize=(10, 5))
-        # Assuming dataframes have a datetime index or a 'Date' column
-        # Adjust column selection as needed
-        obs_col = observed_data.columns[-1]
-        rem_col = remote_data.columns[-1]
-        cor_col = corrected_data.columns[-1]
-
-        ax.plot(observed_data.index, observed_data[obs_col], label='Observed', color='#1d3557', alpha=0.8)
-        ax.plot(remote_data.index, remote_data[rem_col], label='Original Remote', color='#e63946', linestyle='--', alpha=0.7)
-        ax.plot(corrected_data.index, corrected_data[cor_col], label='Corrected', color='#1abc9c')
-
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Value")
-        ax.set_title("Bias Correction Comparison")
-        ax.legend()
-        ax.grid(True, linestyle=':', alpha=0.6)
-        plt.tight_layout()
+        with stage('bias.plot.draw'):
+            fig, ax = plt.subplots(figsize=(10, 5))
+            # Assuming dataframes have a datetime index or a 'Date' column
+            # Adjust column selection as needed
+            obs_col = observed_data.columns[-1]
+            rem_col = remote_data.columns[-1]
+            cor_col = corrected_data.columns[-1]
+
+            ax.plot(observed_data.index, observed_data[obs_col], label='Observed', color='#1d3557', alpha=0.8)
+            ax.plot(remote_data.index, remote_data[rem_col], label='Original Remote', color='#e63946', linestyle='--', alpha=0.7)
+            ax.plot(corrected_data.index, corrected_data[cor_col], label='Corrected', color='#1abc9c')
+
+            ax.set_xlabel("Date")
+            ax.set_ylabel("Value")
+            ax.set_title("Bias Correction Comparison")
+            ax.legend()
+            ax.grid(True, linestyle=':', alpha=0.6)
+            plt.tight_layout()
 
         # Save plot to a bytes buffer
-        buf = BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close(fig) # Close the figure to free memory
-        buf.seek(0)
+        with stage('bias.plot.savefig'):
+            buf = BytesIO()
+            plt.savefig(buf, format='png')
+            plt.close(fig) # Close the figure to free memory
+            buf.seek(0)
 
-        # Encode bytes to base64 string
-        plot_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+            # Encode bytes to base64 string
+            plot_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
         return plot_base64
     except Exception as e:
         print(f"Error generating plot: {e}")
         return None
 
+_compare_pool = None
+_compare_pool_lock = threading.Lock()
+
+def _compare_executor():
+    global _compare_pool
+    with _compare_pool_lock:
+        if _compare_pool is None:
+            _compare_pool = ThreadPoolExecutor(max_workers=min(len(BIAS_METHODS), os.cpu_count() or 1), thread_name_prefix='bias-compare')
+        return _compare_pool
+
+def compare_all(observed_data, modeled_data):
+    """
+    Every method in BIAS_METHODS on the same inputs, run in parallel on
+    one CorrectionInputs so the matching, sorting and statistics are done
+    once. Returns ({method: corrected frame}, {method: error message}); a
+    method that fails only leaves the comparison, and ValueError is raised
+    if every one of them does.
+    """
+    inputs = CorrectionInputs(observed_data, modeled_data)
+    inputs.precompute()
+    executor = _compare_executor()
+    futures = {method: executor.submit(correct, inputs) for method, (_, correct) in BIAS_METHODS.items()}
+    corrected_by_method, errors = {}, {}
+    for method, future in futures.items():
+        try:
+            corrected_by_method[method] = future.result()
+        except Exception as e:
+            errors[method] = str(e)
+    if not corrected_by_method:
+        raise ValueError(f"Every correction method failed, e.g. {BIAS_METHODS[next(iter(errors))][0]}: {next(iter(errors.values()))}")
+    return corrected_by_method, errors
+
+def rank_methods(observed_data, corrected_by_method, errors=None):
+    """
+    Metrics of each method's correction (averaged over the columns of wide
+    files), best RMSE first, as a list of {"rank", "method", "name", metrics,
+    "error"}. Methods in `errors` (see compare_all()) come last, with NaN
+    metrics and their error message.
+    """
+    # every method scored in one pass, on the dates all of them share: (dates, columns, methods)
+    methods = list(corrected_by_method)
+    common_index = observed_data.index
+    for corrected in corrected_by_method.values():
+        common_index = common_index.intersection(corrected.index)
+    observed_columns, modeled_columns = matching_columns(observed_data, corrected_by_method[methods[0]])
+    obs = _values_on(observed_data, common_index, observed_columns)
+    mod = np.stack([_values_on(corrected_by_method[method], common_index, modeled_columns) for method in methods], axis=-1)
+    scores = skill_scores(obs[:, :, None], mod)
+    ranking = []
+    for i, method in enumerate(methods):
+        metrics = pd.DataFrame({metric: values[:, i] for metric, values in scores.items()}).mean().to_dict()
+        ranking.append(dict(metrics, method=method, name=BIAS_METHODS[method][0], error=None))
+    for method, error in (errors or {}).items():
+        ranking.append(dict({metric: float('nan') for metric in scores}, method=method, name=BIAS_METHODS[method][0], error=error))
+    ranking.sort(key=lambda row: (np.isnan(row['RMSE']), row['RMSE']))
+    for rank, row in enumerate(ranking, 1):
+        row['rank'] = rank
+    return ranking
+
+COMPARISON_COLORS = ['#1abc9c', '#f4a261', '#6a4c93', '#2a9d8f', '#e9c46a']
+
+def generate_comparison_plot(observed_data, corrected_by_method, remote_data):
+    """One chart with the observed and remote series and every method's correction, in the given order."""
+    try:
+        with stage('bias.plot.draw'):
+            fig, ax = plt.subplots(figsize=(10, 5))
+            obs_col = observed_data.columns[-1]
+            rem_col = remote_data.columns[-1]
+            ax.plot(observed_data.index, observed_data[obs_col], label='Observed', color='#1d3557', alpha=0.8)
+            ax.plot(remote_data.index, remote_data[rem_col], label='Original Remote', color='#e63946', linestyle='--', alpha=0.7)
+            for (method, corrected), color in zip(corrected_by_method.items(), COMPARISON_COLORS):
+                ax.plot(corrected.index, corrected[corrected.columns[-1]], label=BIAS_METHODS[method][0], color=color, linewidth=1, alpha=0.8)
+
+            ax.set_xlabel("Date")
+            ax.set_ylabel("Value")
+            ax.set_title("Bias Correction Methods Compared")
+            ax.legend()
+            ax.grid(True, linestyle=':', alpha=0.6)
+            plt.tight_layout()
+
+        with stage('bias.plot.savefig'):
+            buf = BytesIO()
+            plt.savefig(buf, format='png')
+            plt.close(fig)
+            buf.seek(0)
+            return base64.b64encode(buf.getvalue()).decode('utf-8')
+    except Exception as e:
+        print(f"Error generating comparison plot: {e}")
+        plt.close('all')
+        return None
+
 # =================================================================================================================
 
 
@@ -166,45 +322,54 @@ def bias(request):
         # Process files dynamically based on extension
         def read_file(file):
             try:
-                if file.name.endswith('.csv'):
-                    return pd.read_csv(file, parse_dates=True, index_col=0)
-                elif file.name.endswith(('.xlsx', '.xls')):
-                    return pd.read_excel(file, parse_dates=True, index_col=0)
-                else:
-                    raise ValueError("Unsupported file format.")
+                return read_upload(file)
             except Exception as e:
                 raise ValueError(f"Error reading file '{file.name}': {e}. Ensure format is correct and first column is a parsable date.")
 
         try:
-            observed_data = read_file(observations_file)
-            remote_data = read_file(remote_sensing_file)
+            # the same files, method and variable as an earlier submission: reuse its results
+            with stage('bias.hash'):
+                observed_digest = upload_digest(observations_file)
+                remote_digest = upload_digest(remote_sensing_file)
+            key = result_key(observed_digest, remote_digest, correction_method, variable_to_correct)
+            cached = load_result(key)
+            if cached is not None:
+                context.update(cached['context'])
+                messages.success(request, f"{cached['method_name']} Bias Correction Processed Successfully!")
+                return render(request, 'tools/bias_correction.html', context)
+
+            with stage('bias.parse'):
+                observed_data = cached_upload(observations_file, observed_digest, read_file)
+                remote_data = cached_upload(remote_sensing_file, remote_digest, read_file)
             corrected_data = None
+            method_ranking = None
             # Apply selected correction method
-            if correction_method == "linear_scaling":
-                correction_method_name = "Linear Scaling"
-                corrected_data = linear_scaling(observed_data, remote_data)
-            elif correction_method == "quantile_mapping":
-                correction_method_name = "Quantile Mapping"
-                corrected_data = quantile_mapping(observed_data, remote_data)
-            elif correction_method == "delta_change":
-                correction_method_name = "Delta Change"
-                corrected_data = delta_change(observed_data, remote_data)
-            elif correction_method == "empirical_quantile":
-                correction_method_name = "Empirical Quantile"
-                corrected_data = empirical_quantile(observed_data, remote_data)
-            elif correction_method == "variance_scaling":
-                correction_method_name = "Variance Scaling"
-                corrected_data = variance_scaling(observed_data, remote_data)
-            else:
-                 messages.error(request, f"Unknown correction method selected: {correction_method}")
-                 return render(request, 'tools/bias_correction.html', context)
+            with stage('bias.correct'):
+                if correction_method == COMPARE_ALL:
+                    # every method at once, the best one (by RMSE) fills the metric cards
+                    correction_method_name = "Method Comparison"
+                    corrected_by_method, errors = compare_all(observed_data, remote_data)
+                    with stage('bias.metrics'):
+                        method_ranking = rank_methods(observed_data, corrected_by_method, errors)
+                    corrected_by_method = {row['method']: corrected_by_method[row['method']] for row in method_ranking if row['error'] is None}
+                    corrected_data = corrected_by_method[method_ranking[0]['method']]
+                    context['method_ranking'] = method_ranking
+                elif correction_method in BIAS_METHODS:
+                    correction_method_name, correct = BIAS_METHODS[correction_method]
+                    corrected_data = correct(CorrectionInputs(observed_data, remote_data))
+                else:
+                     messages.error(request, f"Unknown correction method selected: {correction_method}")
+                     return render(request, 'tools/bias_correction.html', context)
 
             if corrected_data is None or corrected_data.empty:
                  messages.error(request, f"Bias correction method '{correction_method}' failed to produce results.")
                  return render(request, 'tools/bias_correction.html', context)
 
             # Generate Plot
-            plot_data_base64 = generate_plot(observed_data, corrected_data, remote_data)
+            if method_ranking is not None:
+                plot_data_base64 = generate_comparison_plot(observed_data, corrected_by_method, remote_data)
+            else:
+                plot_data_base64 = generate_plot(observed_data, corrected_data, remote_data)
             if plot_data_base64:
                  context['plot_base64'] = plot_data_base64
             else:
@@ -213,10 +378,24 @@ def bias(request):
             # Calculate Metrics (Add error handling)
             try:
                  # Calculate metrics ONLY if corrected_data is valid
-                 metrics_before = calculate_metrics(observed_data, remote_data)
-                 metrics_after = calculate_metrics(observed_data, corrected_data)
+                 with stage('bias.metrics'):
+                     metrics_before = calculate_metrics(observed_data, remote_data)
+                     metrics_after = calculate_metrics(observed_data, corrected_data)
                  context['metrics_before'] = metrics_before
                  context['metrics_after'] = metrics_after
+                 # scores per station / grid cell for wide files
+                 with stage('bias.metrics'):
+                     column_metrics_before = calculate_column_metrics(observed_data, remote_data)
+                     column_metrics_after = calculate_column_metrics(observed_data, corrected_data)
+                 if len(column_metrics_after) > 1:
+                     context['column_metrics'] = [
+                         {"column": column, "before": before, "after": after}
+                         for column, before, after in zip(
+                             column_metrics_after.index,
+                             column_metrics_before.to_dict('records'),
+                             column_metrics_after.to_dict('records'),
+                         )
+                     ]
                  
                  # --- Calculate Percentage Differences ---
                  def calculate_percentage_diff(before, after):
@@ -236,6 +415,9 @@ def bias(request):
                  context['kge_percentage_diff'] = calculate_percentage_diff(metrics_before.get('KGE'), metrics_after.get('KGE'))
 
                  messages.success(request, f"{correction_method_name} Bias Correction Processed Successfully!") # Success message
+                 if 'plot_base64' in context:
+                     result_keys = [k for k in context if k != 'template_name']
+                     store_result(key, {"method_name": correction_method_name, "context": {k: context[k] for k in result_keys}})
             except Exception as e:
                  messages.error(request, f"Error calculating metrics: {e}")
 
@@ -0,0 +1,314 @@
+# Long-horizon forecasts run as background jobs: submitted through the API,
+# executed by a local process pool and tracked as files on disk, so no broker
+# or external queue is needed.
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from tools.views import api_code
+
+
+def jobs_dir():
+    return getattr(settings, 'FORECAST_JOBS_DIR', 'data/jobs')
+
+def job_ttl():
+    # seconds a finished job and its result are kept
+    return getattr(settings, 'FORECAST_JOB_TTL', 24 * 60 * 60)
+
+def job_stale_after():
+    # seconds without progress after which a claimed job's worker is presumed gone
+    return getattr(settings, 'FORECAST_JOB_STALE_AFTER', 15 * 60)
+
+def job_max_attempts():
+    # runs a job gets before a worker dying on it fails the job instead of requeueing it
+    return getattr(settings, 'FORECAST_JOB_MAX_ATTEMPTS', 2)
+
+def _job_path(job_id, suffix='.json'):
+    return os.path.join(jobs_dir(), f"{job_id}{suffix}")
+
+def read_job(job_id):
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_job(job):
+    job['updated'] = time.time()
+    tmp_path = _job_path(job['id'], '.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, _job_path(job['id']))
+
+def _claim_job(job_id):
+    # only one process runs a job, whoever creates its lock file first; it records who holds it
+    try:
+        fd = os.open(_job_path(job_id, '.lock'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(f"{socket.gethostname()} {os.getpid()}")
+    return True
+
+def _lock_owner(job_id, path=None):
+    # (host, pid, lock mtime) of the process holding the job, None if it isn't claimed
+    path = path or _job_path(job_id, '.lock')
+    try:
+        with open(path) as f:
+            content = f.read().split()
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    if len(content) != 2 or not content[1].isdigit():
+        # claimed but not written yet
+        return None, None, mtime
+    return content[0], int(content[1]), mtime
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _is_stale(job, owner):
+    if owner is None or job['status'] not in ('queued', 'running'):
+        return False
+    host, pid, mtime = owner
+    # signal 0 only probes a process on POSIX, elsewhere only the timeout applies
+    if os.name == 'posix' and host == socket.gethostname() and pid and not _process_exists(pid):
+        return True
+    return time.time() - max(job['updated'], mtime) > job_stale_after()
+
+def _recover_stale_job(job, pool):
+    """
+    Requeue a job whose worker died while holding its lock, or fail it once
+    it has had job_max_attempts() runs. Returns the job as it now stands.
+    """
+    owner = _lock_owner(job['id'])
+    if not _is_stale(job, owner):
+        return job
+    # take the lock over by moving it aside, which only one process can do; if what was moved is
+    # no longer the stale lock, another process recovered the job first and it was claimed again
+    lock_path = _job_path(job['id'], '.lock')
+    taken_path = _job_path(job['id'], f'.lock.{uuid.uuid4().hex}')
+    try:
+        os.rename(lock_path, taken_path)
+    except FileNotFoundError:
+        return read_job(job['id']) or job
+    if _lock_owner(job['id'], taken_path) != owner:
+        try:
+            # put it back unless the job has been claimed yet again meanwhile
+            os.link(taken_path, lock_path)
+        except FileExistsError:
+            pass
+        os.remove(taken_path)
+        return read_job(job['id']) or job
+    os.remove(taken_path)
+    job = read_job(job['id']) or job
+    if job.get('attempts', 0) >= job_max_attempts():
+        job['status'] = 'failed'
+        job['error'] = "The worker running this job stopped."
+        _write_job(job)
+    else:
+        job['status'] = 'queued'
+        _write_job(job)
+        pool.submit(run_forecast_job, job['id'])
+    return job
+
+def recover_stale_jobs():
+    pool = job_pool()
+    for name in os.listdir(jobs_dir()):
+        job = read_job(name[:-len('.json')]) if name.endswith('.json') else None
+        if job:
+            _recover_stale_job(job, pool)
+
+def delete_job(job_id):
+    for suffix in ('.json', '.npy', '.lock'):
+        try:
+            os.remove(_job_path(job_id, suffix))
+        except FileNotFoundError:
+            pass
+
+def purge_expired_jobs():
+    now = time.time()
+    for name in os.listdir(jobs_dir()):
+        if not name.endswith('.json'):
+            continue
+        job = read_job(name[:-len('.json')])
+        if job and job['status'] in ('done', 'failed') and now - job['updated'] > job_ttl():
+            delete_job(job['id'])
+
+def run_forecast_job(job_id):
+    """
+    Executed in a pool process. Runs the forecast described by the job file,
+    recording progress as future days completed, and saves the result as
+    a structured (Date, Lake_Level) .npy next to the job.
+    """
+    if not _claim_job(job_id):
+        return
+    job = read_job(job_id)
+    if job is None:
+        return
+    try:
+        job['status'] = 'running'
+        job['attempts'] = job.get('attempts', 0) + 1
+        # a retry starts over, without the days of the attempt that died
+        job['days_done'] = 0
+        _write_job(job)
+        # pool processes live long, pick up a new model or workbook before starting
+        api_code.reload_resources()
+        training_data = api_code.get_training_data()
+        start, end, horizon = job['start'], job['end'], job['horizon']
+        start_date, end_date, training_data = api_code._forecast_range(start, end, training_data)
+        if end_date > training_data.max_date:
+            resources = api_code._resources_for(training_data)
+            days = (end_date - training_data.max_date).days
+            # blocks are horizon-sized, except where a cached prefix ends
+            for block in api_code._iter_future_levels(resources, training_data, days, horizon):
+                job['days_done'] += len(block)
+                _write_job(job)
+        records = api_code.forecast_arrays(start, end, training_data, horizon)
+        with open(_job_path(job_id, '.npy.tmp'), 'wb') as f:
+            np.save(f, records, allow_pickle=False)
+        os.replace(_job_path(job_id, '.npy.tmp'), _job_path(job_id, '.npy'))
+        job['status'] = 'done'
+        job['days_done'] = job['days_total']
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    _write_job(job)
+
+def _init_job_worker():
+    import django
+    django.setup()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def job_pool():
+    """
+    Process pool running forecast jobs, FORECAST_JOB_WORKERS processes. Jobs
+    still queued on disk when the pool starts (e.g. after a restart) are
+    picked up again, as are jobs whose worker died holding them.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            os.makedirs(jobs_dir(), exist_ok=True)
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'FORECAST_JOB_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_job_worker,
+            )
+            for name in os.listdir(jobs_dir()):
+                job = read_job(name[:-len('.json')]) if name.endswith('.json') else None
+                if job is None:
+                    continue
+                owner = _lock_owner(job['id'])
+                if _is_stale(job, owner):
+                    _recover_stale_job(job, _pool)
+                elif job['status'] == 'queued' and owner is None:
+                    _pool.submit(run_forecast_job, job['id'])
+        return _pool
+
+def submit_forecast_job(start, end, horizon=120):
+    training_data = api_code.get_training_data()
+    start_date, end_date, training_data = api_code._forecast_range(start, end, training_data)
+    days = max((end_date - training_data.max_date).days, 0)
+    pool = job_pool()
+    purge_expired_jobs()
+    recover_stale_jobs()
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": "queued",
+        "created": time.time(),
+        "start": start,
+        "end": end,
+        "horizon": horizon,
+        "days_done": 0,
+        "days_total": days,
+        "attempts": 0,
+        "error": None,
+    }
+    _write_job(job)
+    pool.submit(run_forecast_job, job['id'])
+    return job
+
+def _expired(job):
+    return job['status'] in ('done', 'failed') and time.time() - job['updated'] > job_ttl()
+
+class ForecastJobSubmitView(APIView):
+    """
+    Queue a forecast (same body as /forecast/) and return its job id right
+    away, for ranges that would take too long to answer inline.
+    """
+    def post(self, request):
+        serializer = api_code.ForecastRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        start = api_code._date_parts(serializer.validated_data, 'start')
+        end = api_code._date_parts(serializer.validated_data, 'end')
+        try:
+            job = submit_forecast_job(start, end)
+        except AssertionError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        job_url = reverse('forecast-job', args=[job['id']])
+        return Response({"job_id": job['id'], "status": job['status'], "status_url": job_url}, status=status.HTTP_202_ACCEPTED)
+
+class ForecastJobView(APIView):
+    def get(self, request, job_id):
+        job = read_job(job_id)
+        if job is None or _expired(job):
+            return Response({"error": "Unknown or expired job."}, status=status.HTTP_404_NOT_FOUND)
+        job = _recover_stale_job(job, job_pool())
+        payload = {
+            "job_id": job['id'],
+            "status": job['status'],
+            "progress": {"days_done": job['days_done'], "days_total": job['days_total']},
+            "error": job['error'],
+        }
+        if job['status'] == 'done':
+            payload["result_url"] = reverse('forecast-job-result', args=[job['id']])
+            payload["expires"] = job['updated'] + job_ttl()
+        return Response(payload, status=status.HTTP_200_OK)
+
+class ForecastJobResultView(APIView):
+    # same formats as /forecast/ except streaming
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [api_code.ColumnarJSONRenderer, api_code.NpyRenderer]
+
+    def get(self, request, job_id):
+        job = read_job(job_id)
+        if job is None or _expired(job):
+            return Response({"error": "Unknown or expired job."}, status=status.HTTP_404_NOT_FOUND)
+        if job['status'] != 'done':
+            return Response({"error": f"Job is {job['status']}."}, status=status.HTTP_409_CONFLICT)
+        try:
+            records = np.load(_job_path(job['id'], '.npy'), allow_pickle=False)
+        except FileNotFoundError:
+            return Response({"error": "The job's result is no longer available."}, status=status.HTTP_410_GONE)
+        if request.accepted_renderer.format == api_code.NpyRenderer.format:
+            return Response(records, status=status.HTTP_200_OK)
+        if request.accepted_renderer.format == api_code.ColumnarJSONRenderer.format:
+            return Response(api_code._columnar(records), status=status.HTTP_200_OK)
+        dates = pd.DatetimeIndex(records['Date']).strftime('%Y-%m-%d')
+        results = [{"Date": d, "Lake_Level": l} for d, l in zip(dates, records['Lake_Level'].tolist())]
+        return Response({"forecast": results}, status=status.HTTP_200_OK)
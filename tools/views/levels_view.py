@@ -9,7 +9,8 @@ matplotlib.use('Agg')  # Set backend before importing pyplot
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-from tools.views.api_code import forecast, training_data
+from tools.views.api_code import forecast, get_training_data
+from tools.instrumentation import stage
 
 
 # function for plotting the results
@@ -23,34 +24,36 @@ def generate_plot(results_df, selected_variable):
             lambda x: x[0] if isinstance(x, (list, np.ndarray)) and len(x) > 0 else x
         )
 
-        # Create the plot
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.plot(
-            results_df.index, 
-            results_df[selected_variable], 
-            label='Water Levels', 
-            color='#1abc9c', 
-            linewidth=2,
-            alpha=0.8
-        )
+        with stage('levels.plot.draw'):
+            # Create the plot
+            fig, ax = plt.subplots(figsize=(12, 6))
+            ax.plot(
+                results_df.index, 
+                results_df[selected_variable], 
+                label='Water Levels', 
+                color='#1abc9c', 
+                linewidth=2,
+                alpha=0.8
+            )
         
-        # Styling
-        ax.set_xlabel("Date", fontsize=12, fontweight='bold')
-        ax.set_ylabel("Water Level (m)", fontsize=12, fontweight='bold')
-        ax.set_title("Predicted Water Levels over Time", fontsize=14, fontweight='bold', pad=20)
-        ax.legend(loc='best', frameon=True, shadow=True)
-        ax.grid(True, linestyle=':', alpha=0.6, linewidth=0.5)
+            # Styling
+            ax.set_xlabel("Date", fontsize=12, fontweight='bold')
+            ax.set_ylabel("Water Level (m)", fontsize=12, fontweight='bold')
+            ax.set_title("Predicted Water Levels over Time", fontsize=14, fontweight='bold', pad=20)
+            ax.legend(loc='best', frameon=True, shadow=True)
+            ax.grid(True, linestyle=':', alpha=0.6, linewidth=0.5)
         
-        # Rotate x-axis labels for better readability
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
+            # Rotate x-axis labels for better readability
+            plt.xticks(rotation=45, ha='right')
+            plt.tight_layout()
 
         # Convert plot to base64
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-        plt.close(fig)
-        buf.seek(0)
-        plot_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+        with stage('levels.plot.savefig'):
+            buf = BytesIO()
+            plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+            plt.close(fig)
+            buf.seek(0)
+            plot_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
         
         return plot_base64
     
@@ -116,7 +119,8 @@ def levels(request):
             }
 
             # Generate forecast
-            results = forecast(start, end, training_data)
+            with stage('levels.forecast'):
+                results = forecast(start, end, get_training_data())
             
             # Validate forecast results
             if not results or len(results) == 0: